@@ -0,0 +1,53 @@
+// Clientside callbacks of the rocket builder, see app.clientside_callback in rocket_builder_page.py
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    rocket_builder: {
+        /**
+         * Draws the side view of the rocket from the rocket-builder-data store.
+         *
+         * The fins are spread evenly around the body tube, the first one pointing up. Every fin is projected onto the
+         * drawing plane, so a fin at angle θ appears with its radial extent scaled by cos θ. Fins that point straight
+         * at the viewer are not drawn.
+         *
+         * @param ts The modified timestamp of the store.
+         * @param data The rocket-builder-data store: the dimensions of the rocket, see drawing_keys.
+         * @param defaults The default value of every key, for keys that are not in the store yet.
+         * @returns The figure.
+         */
+        draw_rocket: function (ts, data, defaults) {
+            data = Object.assign({}, defaults, data || {});
+
+            const noseLength = data.nose_cone_length;
+            const length = noseLength + data.body_tube_length;
+            const radius = data.diameter / 2;
+            const rootStart = length - data.root_chord;
+            const finHeight = data.fin_height;
+            const finCount = Math.max(Math.round(data.number_of_fins), 0);
+
+            const x = [0, noseLength, noseLength, 0, null,
+                       noseLength, noseLength, length, length, noseLength];
+            const y = [0, radius, -radius, 0, null,
+                       radius, -radius, -radius, radius, radius];
+
+            const finX = [length, rootStart, rootStart + data.sweep_length,
+                          rootStart + data.sweep_length + data.tip_chord, length];
+            const finR = [radius, radius, radius + finHeight, radius + finHeight, radius];
+            for (let i = 0; i < finCount; i++) {
+                const cos = Math.cos(2 * Math.PI * i / finCount);
+                if (Math.abs(cos) < 1e-9) {
+                    continue;
+                }
+                x.push(null, ...finX);
+                y.push(null, ...finR.map(r => r * cos));
+            }
+
+            return {
+                data: [{x: x, y: y, type: 'scatter', mode: 'lines', fill: 'toself'}],
+                layout: {
+                    plot_bgcolor: 'white',
+                    xaxis: {visible: false},
+                    yaxis: {visible: false, scaleanchor: 'x', scaleratio: 1}
+                }
+            };
+        }
+    }
+});
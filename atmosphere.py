@@ -0,0 +1,184 @@
+""" The International Standard Atmosphere (ISA), tabulated for the flight simulation.
+
+The temperature follows the ISA layers up to the mesosphere, shifted by a constant temperature offset (ISA + ΔT), and
+the pressure follows from the hydrostatic equation with that temperature, starting at 101325 Pa at sea level. An
+Atmosphere tabulates the density, temperature and speed of sound above a launch site every metre, once, so a lookup is
+an index calculation instead of the layer formulas. One metre is fine enough that the nearest entry is within 0.01 % of
+the exact density.
+
+Usage from a script::
+
+    from atmosphere import atmosphere
+
+    air = atmosphere(elevation=1400, temperature_offset=10)
+    print(air.density(0), air.density(np.array([1000.0, 3000.0])))
+"""
+import math
+import threading
+from typing import Dict, Tuple, Union
+
+import numpy as np
+
+Number = Union[float, np.ndarray]
+
+# Specific gas constant of dry air (J/(kg K)), its ratio of specific heats, and the standard gravity of the ISA (m/s^2)
+gas_constant = 287.05287
+heat_capacity_ratio = 1.4
+standard_gravity = 9.80665
+# The radius of the earth (m) that converts geometric to geopotential altitudes
+earth_radius = 6356766.0
+sea_level_temperature = 288.15  # K
+sea_level_pressure = 101325.0  # Pa
+# The ISA layers: the geopotential altitude (m) of their base and their temperature lapse rate (K/m). The last layer
+# continues upwards.
+layers = ((0.0, -0.0065), (11000.0, 0.0), (20000.0, 0.001), (32000.0, 0.0028), (47000.0, 0.0), (51000.0, -0.0028),
+          (71000.0, -0.002))
+
+# The tables of an Atmosphere reach this far (m) above the launch site, with an entry every table_step (m). Higher
+# altitudes get the values at the top of the table.
+table_height = 40000.0
+table_step = 1.0
+
+
+def isa(altitude: Number, temperature_offset: float = 0.0) -> Tuple[Number, Number]:
+    """ :param altitude: The geometric altitude above sea level (m). A number or an array.
+    :param temperature_offset: Added to the ISA temperature at every altitude (K).
+    :return: The temperature (K) and the pressure (Pa).
+    """
+    altitude = np.asarray(altitude, dtype=float)
+    h = earth_radius * altitude / (earth_radius + altitude)
+
+    # The temperature and pressure at the base of every layer
+    base_temperatures = [sea_level_temperature + temperature_offset]
+    base_pressures = [sea_level_pressure]
+    for (base, lapse), (top, _) in zip(layers, layers[1:]):
+        top_temperature = base_temperatures[-1] + lapse * (top - base)
+        base_pressures.append(_pressure(base_pressures[-1], base_temperatures[-1], top_temperature, lapse, top - base))
+        base_temperatures.append(top_temperature)
+
+    layer = np.maximum(np.searchsorted([base for base, _ in layers], h, side='right') - 1, 0)
+    temperature = np.empty_like(h)
+    pressure = np.empty_like(h)
+    for i, (base, lapse) in enumerate(layers):
+        rows = layer == i
+        dh = h[rows] - base
+        temperature[rows] = base_temperatures[i] + lapse * dh
+        pressure[rows] = _pressure(base_pressures[i], base_temperatures[i], temperature[rows], lapse, dh)
+    if temperature.ndim == 0:
+        return float(temperature), float(pressure)
+    return temperature, pressure
+
+
+def _pressure(base_pressure: float, base_temperature: float, temperature: Number, lapse: float, dh: Number) -> Number:
+    """ :return: The pressure dh above the base of a layer, from the hydrostatic equation. """
+    if lapse == 0:
+        return base_pressure * np.exp(-standard_gravity * dh / (gas_constant * base_temperature))
+    return base_pressure * (base_temperature / temperature) ** (standard_gravity / (gas_constant * lapse))
+
+
+class Atmosphere:
+    def __init__(self, elevation: float = 0.0, temperature_offset: float = 0.0, height: float = table_height,
+                 step: float = table_step):
+        """ The atmosphere above a launch site, tabulated.
+
+        Altitudes are above the launch site, like the altitudes of the simulation. Altitudes below the launch site get
+        the values at the launch site.
+
+        :param elevation: The altitude of the launch site above sea level (m).
+        :param temperature_offset: The difference from the ISA temperature (K), e.g. 15 on a hot summer day.
+        :param height: The height of the tables above the launch site (m).
+        :param step: The altitude between two entries of the tables (m).
+        """
+        self.elevation = elevation
+        self.temperature_offset = temperature_offset
+        self.step = step
+        self.altitudes = np.arange(int(math.ceil(height / step)) + 1) * step
+        self.temperatures, pressures = isa(elevation + self.altitudes, temperature_offset)
+        self.densities = pressures / (gas_constant * self.temperatures)
+        self.speeds_of_sound = np.sqrt(heat_capacity_ratio * gas_constant * self.temperatures)
+        # The integral of sqrt(density) from the launch site up: the time a body needs to fall from an altitude at its
+        # terminal velocity is proportional to it
+        root_density = np.sqrt(self.densities)
+        self.root_density_integral = np.concatenate(
+            [[0.0], np.cumsum((root_density[1:] + root_density[:-1]) * (step / 2))])
+        self.size = len(self.altitudes)
+        self.inverse_step = 1 / step
+        self.density_list = self.densities.tolist()  # Indexing a list is faster than an array for single floats
+
+    @property
+    def ground_density(self) -> float:
+        """ :return: The density at the launch site (kg/m^3), the highest density of a flight. """
+        return self.density_list[0]
+
+    def index(self, altitude: Number) -> np.ndarray:
+        """ :param altitude: The altitude above the launch site (m). A number or an array.
+        :return: The index of the nearest table entry, clipped to the table. NaN gets index 0.
+        """
+        x = np.minimum(np.asarray(altitude, dtype=float) * self.inverse_step + 0.5, self.size - 1)
+        with np.errstate(invalid='ignore'):
+            index = x.astype(np.intp)  # NaN becomes a negative or zero index
+        return np.maximum(index, 0)
+
+    def density(self, altitude: Number) -> Number:
+        """ :param altitude: The altitude above the launch site (m). A number or an array.
+        :return: The air density (kg/m^3).
+        """
+        return self.densities[self.index(altitude)]
+
+    def temperature(self, altitude: Number) -> Number:
+        """ :return: The air temperature (K) at the altitude above the launch site (m). """
+        return self.temperatures[self.index(altitude)]
+
+    def speed_of_sound(self, altitude: Number) -> Number:
+        """ :return: The speed of sound (m/s) at the altitude above the launch site (m). """
+        return self.speeds_of_sound[self.index(altitude)]
+
+    def density_at(self, altitude: float) -> float:
+        """ density for a single float, for the step loops of the scalar simulations. Several times faster than
+        density, which goes through NumPy.
+        """
+        x = altitude * self.inverse_step + 0.5
+        # NaN fails both comparisons and gets the launch site, like in index
+        return self.density_list[int(x)] if 0 <= x < self.size else self.density_list[-1 if x >= self.size else 0]
+
+    def descent_time(self, altitude: Number, drag_constant: Number, weight: Number) -> Number:
+        """ The time a body needs to fall to the launch site at its terminal velocity sqrt(weight / (c * ρ)), which
+        slows down as the air gets denser.
+
+        :param altitude: The altitude above the launch site (m).
+        :param drag_constant: The drag force divided by ρ v^2 (0.5 * Cd * A) (m^2).
+        :param weight: The weight, g * m (N).
+        :return: The time (s).
+        """
+        return np.sqrt(drag_constant / weight) * np.interp(altitude, self.altitudes, self.root_density_integral)
+
+    def descent_altitudes(self, altitude: float, drag_constant: float, weight: float, times: Number) -> Number:
+        """ :param times: Times (s) since the body was at the altitude, falling at its terminal velocity.
+        :return: The altitudes at those times, 0 once it has landed. See descent_time.
+        """
+        integral = np.interp(altitude, self.altitudes, self.root_density_integral) - \
+            times * math.sqrt(weight / drag_constant)
+        # Only the table below the altitude is searched
+        end = min(int(altitude * self.inverse_step) + 2, self.size)
+        return np.interp(integral, self.root_density_integral[:end], self.altitudes[:end])
+
+
+# The atmospheres that have been tabulated, by elevation and temperature offset
+_atmospheres: Dict[Tuple[float, float], Atmosphere] = {}
+_atmospheres_lock = threading.Lock()
+
+
+def atmosphere(elevation: float = 0.0, temperature_offset: float = 0.0) -> Atmosphere:
+    """ :return: The atmosphere above the launch site, tabulated on first use. """
+    key = (float(elevation), float(temperature_offset))
+    air = _atmospheres.get(key)
+    if air is None:
+        with _atmospheres_lock:
+            air = _atmospheres.get(key)
+            if air is None:
+                air = _atmospheres[key] = Atmosphere(*key)
+    return air
+
+
+# The ISA density at sea level (kg/m^3)
+sea_level_density = sea_level_pressure / (gas_constant * sea_level_temperature)
@@ -0,0 +1,243 @@
+""" Simulates rockets from the command line, without the web app.
+
+The rockets are read from a .json file (one object, a list of objects or one object per line) or a .csv file (one
+rocket per row), with the keys of the rocket-builder-data store. Every rocket flies with every motor given with
+--motors, or with the motor in its own motor_file key. The flights run in a process pool, and the summary of every
+flight (and optionally its trajectory) is written as soon as it has finished, so the memory use doesn't grow with the
+number of flights.
+
+Examples::
+
+    python batch_simulate.py rockets.csv --motors Estes_D12.eng Estes_C6.eng --output flights.csv
+    python batch_simulate.py rockets.json --integrator rk45 --output flights.jsonl --trajectories flights.npz
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, TextIO, Tuple
+
+import numpy as np
+
+from simulation import INTEGRATORS, Motor, Rocket, SimConfig, Trajectory, simulate
+
+# The formats of the --output and --trajectories files, by file extension
+summary_formats = ('.csv', '.jsonl')
+trajectory_formats = ('.csv', '.jsonl', '.npz')
+# The columns of the summaries, see fly
+summary_columns = ('flight', 'rocket', 'motor') + Trajectory.summary_keys
+# The number of unfinished flights per worker; bounds the memory used by flights that are queued or not yet written
+flights_per_worker = 4
+
+
+def read_rockets(path: str) -> Iterator[dict]:
+    """ :param path: A .json or .csv file of rockets.
+    :return: The rockets as rocket-builder-data dicts, one at a time. Numeric CSV values become floats.
+    """
+    with open(path, newline='') as f:
+        if path.endswith('.csv'):
+            for row in csv.DictReader(f):
+                yield {key: _number(value) for key, value in row.items() if value not in (None, '')}
+            return
+        # One rocket per line is read line by line, so that only one rocket is in memory at a time. A list, or an object
+        # that spans several lines, is read whole.
+        lines = (line for line in f if line.strip())
+        first = next(lines, None)
+        if first is None:
+            return
+        try:
+            rocket = json.loads(first)
+        except json.JSONDecodeError:
+            rocket = None
+        if not isinstance(rocket, dict):
+            f.seek(0)
+            data = json.load(f)
+            yield from data if isinstance(data, list) else [data]
+            return
+        yield rocket
+        for line in lines:
+            yield json.loads(line)
+
+
+def _number(value: str):
+    try:
+        return float(value)
+    except ValueError:
+        return value
+
+
+def flights(rockets: Iterable[dict], motor_files: List[str]) -> Iterator[Tuple[int, dict, str]]:
+    """ :param rockets: The rockets.
+    :param motor_files: The motors every rocket flies with. If empty, the motor_file of the rocket is used.
+    :return: The number, rocket and motor file of every flight.
+    """
+    number = 0
+    for rocket in rockets:
+        for motor_file in motor_files or [rocket.get('motor_file')]:
+            if not motor_file:
+                raise ValueError(f'Rocket {rocket} has no motor_file and no --motors were given')
+            yield number, rocket, motor_file
+            number += 1
+
+
+def fly(task: Tuple[int, dict, Motor, SimConfig, bool]) -> Tuple[dict, Optional[Trajectory]]:
+    """ Simulates one flight in a worker process.
+
+    :return: The summary of the flight and, if requested, its trajectory.
+    """
+    number, rocket_data, motor, config, keep_trajectory = task
+    trajectory = simulate(Rocket.from_data(rocket_data), motor, config)
+    summary = {'flight': number,
+               'rocket': rocket_data.get('name', ''),
+               'motor': motor.name,
+               **trajectory.summary()}
+    if keep_trajectory:
+        trajectory.shrink()
+        return summary, trajectory
+    return summary, None
+
+
+def run(tasks: Iterable[tuple], workers: int = None) -> Iterator[Tuple[dict, Optional[Trajectory]]]:
+    """ Runs fly on every task in a process pool, keeping only a few tasks per worker in flight.
+
+    :return: The results, in the order in which the flights finish.
+    """
+    workers = workers or os.cpu_count() or 1
+    tasks = iter(tasks)
+    if workers == 1:
+        yield from map(fly, tasks)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = {executor.submit(fly, task) for task in islice(tasks, workers * flights_per_worker)}
+        while pending:
+            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+            pending |= {executor.submit(fly, task) for task in islice(tasks, len(finished))}
+            for future in finished:
+                yield future.result()
+
+
+class SummaryWriter:
+    def __init__(self, f: TextIO, file_format: str):
+        """ Writes one summary per line.
+
+        :param f: The open output file.
+        :param file_format: .csv or .jsonl.
+        """
+        self.f = f
+        self.file_format = file_format
+        self._csv = None
+
+    def write(self, summary: Dict[str, float]):
+        if self.file_format == '.jsonl':
+            self.f.write(json.dumps(summary) + '\n')
+            return
+        if self._csv is None:
+            # Every possible column; events that a flight didn't have are empty
+            self._csv = csv.DictWriter(self.f, fieldnames=summary_columns, restval='')
+            self._csv.writeheader()
+        self._csv.writerow(summary)
+
+
+class TrajectoryWriter:
+    def __init__(self, path: str):
+        """ Writes the trajectory of every flight as soon as the flight has finished.
+
+        .csv has one row per sample with the flight number and the trajectory columns, .jsonl one line per flight
+        with a list per column, and .npz one array per flight and column, named e.g. 'flight_12_t'.
+
+        :param path: The output file.
+        """
+        self.file_format = os.path.splitext(path)[1]
+        if self.file_format == '.npz':
+            self._zip = zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_STORED, allowZip64=True)
+            self.f = None
+        else:
+            self._zip = None
+            self.f = open(path, 'w', newline='')
+            if self.file_format == '.csv':
+                self.f.write(','.join(('flight',) + Trajectory.columns) + '\n')
+
+    def write(self, number: int, trajectory: Trajectory):
+        data = trajectory.data[:trajectory.size]
+        if self.file_format == '.npz':
+            for i, column in enumerate(Trajectory.columns):
+                with self._zip.open(f'flight_{number}_{column}.npy', 'w', force_zip64=True) as f:
+                    np.lib.format.write_array(f, np.ascontiguousarray(data[:, i]))
+        elif self.file_format == '.jsonl':
+            self.f.write(json.dumps({'flight': number,
+                                     **{column: data[:, i].tolist() for i, column in enumerate(Trajectory.columns)}})
+                         + '\n')
+        else:
+            buffer = io.StringIO()
+            np.savetxt(buffer, np.column_stack([np.full(len(data), number), data]), fmt='%.10g', delimiter=',')
+            self.f.write(buffer.getvalue())
+
+    def close(self):
+        if self._zip is not None:
+            self._zip.close()
+        else:
+            self.f.close()
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description='Simulates rockets without the web app.')
+    parser.add_argument('rockets', help='a .json or .csv file of rockets, with the keys of rocket-builder-data')
+    parser.add_argument('--motors', nargs='*', default=[],
+                        help='the .eng files in thrustcurve/ every rocket flies with. Default: the motor_file of '
+                             'every rocket')
+    parser.add_argument('--output', default='-', help='the summary file, .csv or .jsonl. Default: CSV to stdout')
+    parser.add_argument('--trajectories', help='also write the trajectories, to a .csv, .jsonl or .npz file')
+    parser.add_argument('--integrator', choices=INTEGRATORS, default=SimConfig.integrator)
+    parser.add_argument('--dt', type=float, default=SimConfig.dt, help='the time step (s) of euler and rk4')
+    parser.add_argument('--decimation', type=int, default=SimConfig.decimation,
+                        help='record every n-th step of the trajectories')
+    parser.add_argument('--elevation', type=float, default=SimConfig.launch_elevation,
+                        help='the altitude (m) of the launch site above sea level')
+    parser.add_argument('--temperature-offset', type=float, default=SimConfig.temperature_offset,
+                        help='the difference (K) of the air temperature from the standard atmosphere')
+    parser.add_argument('--workers', type=int, help='the number of processes. Default: the number of CPUs')
+    args = parser.parse_args(argv)
+
+    summary_format = '.csv' if args.output == '-' else os.path.splitext(args.output)[1]
+    if summary_format not in summary_formats:
+        parser.error(f'--output should be one of {", ".join(summary_formats)}')
+    if args.trajectories and os.path.splitext(args.trajectories)[1] not in trajectory_formats:
+        parser.error(f'--trajectories should be one of {", ".join(trajectory_formats)}')
+
+    # Only imported here: loading the motor catalog isn't needed for --help
+    import thrust_curve as tc
+    motors = {}
+
+    def motor(file_name: str) -> Motor:
+        if file_name not in motors:
+            motors[file_name] = Motor.from_thrust_curve(tc.get_thrust_curve(file_name))
+        return motors[file_name]
+
+    config = SimConfig(dt=args.dt, decimation=args.decimation, integrator=args.integrator,
+                       launch_elevation=args.elevation, temperature_offset=args.temperature_offset)
+    tasks = ((number, rocket, motor(motor_file), config, bool(args.trajectories))
+             for number, rocket, motor_file in flights(read_rockets(args.rockets), args.motors))
+
+    out = sys.stdout if args.output == '-' else open(args.output, 'w', newline='')
+    trajectory_writer = TrajectoryWriter(args.trajectories) if args.trajectories else None
+    try:
+        summary_writer = SummaryWriter(out, summary_format)
+        for summary, trajectory in run(tasks, args.workers):
+            summary_writer.write(summary)
+            if trajectory_writer:
+                trajectory_writer.write(summary['flight'], trajectory)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+        if trajectory_writer:
+            trajectory_writer.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
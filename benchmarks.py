@@ -0,0 +1,247 @@
+""" Microbenchmarks of the thrust curve math, the motor catalog, the thrust curve filters and the flight simulation.
+
+Every benchmark runs with the same representative motors, from a small Estes motor to a large AeroTech M, so results
+of different runs can be compared. The import time of the entry points is measured in fresh interpreters, with a report
+of the slowest modules, and the command fails if it is over its budget in import_budgets. The results are written as
+JSON. With --compare, they are compared with a saved baseline and the command fails if any benchmark got slower by more
+than the threshold.
+
+Examples::
+
+    python benchmarks.py --output baseline.json
+    python benchmarks.py --output current.json --compare baseline.json --threshold 0.2
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import asdict
+from typing import Callable, Dict, List
+
+import numpy as np
+
+import thrust_curve as tc
+from motor_catalog import load_catalog
+from simulation import Motor, Rocket, SimConfig, simulate
+
+# The representative motors, and a rocket that fits each of them
+motors = {'Estes_A8.eng': Rocket(mass=0.03, diameter=0.025, parachute_diameter=0.3, parachute_deploy_delay=3),
+          'Estes_C6.eng': Rocket(mass=0.08, diameter=0.025, parachute_diameter=0.3, parachute_deploy_delay=5),
+          'AeroTech_G80.eng': Rocket(mass=0.6, diameter=0.04, parachute_diameter=0.6, parachute_deploy_delay=7),
+          'AeroTech_J350.eng': Rocket(mass=3, diameter=0.1, parachute_diameter=1.2, parachute_deploy_delay=10),
+          'AeroTech_L1150.eng': Rocket(mass=8, diameter=0.1, parachute_diameter=2, parachute_deploy_delay=14),
+          'AeroTech_M1297.eng': Rocket(mass=14, diameter=0.15, parachute_diameter=3, parachute_deploy_delay=16)}
+
+# A benchmark is repeated this many times; the median and the minimum are reported
+default_rounds = 7
+# Every round runs the benchmark as often as fits in this time (s), at least once
+round_time = 0.2
+# --compare flags benchmarks whose median got slower by more than this fraction
+default_threshold = 0.2
+# The budgets (s) of the import time of a fresh interpreter: the app, the command line simulator, and what a pool
+# worker that is spawned for a Monte Carlo chunk imports
+import_budgets = {'index': 1.5, 'batch_simulate': 0.5, 'monte_carlo': 0.5}
+# The number of modules with the largest own import time in the import report
+import_report_size = 10
+
+
+def measure(function: Callable[[], object], rounds: int = default_rounds) -> Dict[str, float]:
+    """ :param function: The code to time.
+    :param rounds: The number of rounds.
+    :return: The median and minimum time per call (s), the number of rounds and the number of calls per round.
+    """
+    start = time.perf_counter()
+    function()
+    once = time.perf_counter() - start
+    number = max(int(round_time / once), 1) if once > 0 else 1000
+    times = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        times.append((time.perf_counter() - start) / number)
+    return {'median': statistics.median(times), 'min': min(times), 'rounds': rounds, 'number': number}
+
+
+def import_time(module: str, rounds: int = default_rounds) -> dict:
+    """ Imports the module in fresh interpreters, like a cold start or a respawned worker.
+
+    :param module: The module to import.
+    :param rounds: The number of interpreters to time.
+    :return: The median and minimum wall time (s), and the modules with the largest own import time according to
+    python -X importtime, slowest first.
+    """
+    directory = os.path.dirname(os.path.abspath(__file__))
+    times = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', f'import {module}'], cwd=directory, check=True)
+        times.append(time.perf_counter() - start)
+
+    report = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'], cwd=directory,
+                            check=True, stderr=subprocess.PIPE, universal_newlines=True).stderr
+    modules = []
+    for line in report.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|')
+        modules.append({'module': name.strip(), 'self': int(own) / 1e6, 'cumulative': int(cumulative) / 1e6})
+    modules.sort(key=lambda m: m['self'], reverse=True)
+    return {'median': statistics.median(times), 'min': min(times), 'rounds': rounds, 'number': 1,
+            'top': modules[:import_report_size]}
+
+
+def benchmarks() -> Dict[str, Callable[[], object]]:
+    """ :return: The benchmarks by name. Their setup (reading files, building inputs) isn't timed. """
+    cases = {}
+    for file_name, rocket in motors.items():
+        name = os.path.splitext(file_name)[0]
+        with open(os.path.join(tc.thrust_folder, file_name)) as f:
+            text = f.read()
+        curve = tc.read_eng_thrust_curve(text)
+        motor = Motor.from_thrust_curve(tc.get_thrust_curve(file_name))
+        cases[f'read_eng_thrust_curve[{name}]'] = lambda text=text: tc.read_eng_thrust_curve(text)
+        cases[f'interpolate_thrust_curve[{name}]'] = lambda curve=curve: tc.interpolate_thrust_curve(curve)
+        cases[f'get_5_percent_thrust_range[{name}]'] = lambda curve=curve: tc.get_5_percent_thrust_range(curve)
+        cases[f'calc_impulse[{name}]'] = lambda curve=curve: tc.calc_impulse(curve)
+        for integrator in ('euler', 'rk45'):
+            config = SimConfig(integrator=integrator)
+            cases[f'simulate[{name},{integrator}]'] = \
+                lambda rocket=rocket, motor=motor, config=config: simulate(rocket, motor, config)
+
+    cases['build_catalog'] = lambda: tc.build_catalog(tc.thrust_files, workers=1)
+    cases['load_catalog'] = lambda: load_catalog(tc.catalog_file)
+    cases.update(page_benchmarks())
+    return cases
+
+
+def page_benchmarks() -> Dict[str, Callable[[], object]]:
+    """ :return: The benchmarks of the page callbacks, called directly without the Dash request handling. """
+    import session_store
+    import sim_cache
+    # Keep the benchmark sessions out of the app database, and time the simulation rather than the cache
+    session_store.session_store.path = os.path.join(tempfile.mkdtemp(), 'sessions.sqlite3')
+    sim_cache.cache.directory = None
+    from pages import plots_page, thrust_curve_page as tc_page
+
+    cases = {}
+    view = tc_page.catalog_view()
+    diameter_vals = [0, len(view.diameters) - 1]
+    full_ranges = [[tc_page.do_log(values[0]), tc_page.do_log(values[-1])]
+                   for values in (view.lengths, view.impulses, view.avg_thrusts, view.burn_times)]
+    cases['apply_filters[all]'] = lambda: tc_page.apply_filters.__wrapped__('<all>', diameter_vals, *full_ranges)
+    cases['apply_filters[AeroTech]'] = lambda: tc_page.apply_filters.__wrapped__('AeroTech', diameter_vals,
+                                                                                 *full_ranges)
+
+    for file_name, rocket in motors.items():
+        session_id = f'benchmark-{file_name}'
+        session_store.session_store.set(session_id, 'rocket', asdict(rocket))
+        session_store.session_store.set(session_id, 'motor', {'motor_file': file_name})
+
+        def graphs(session_id=session_id):
+            sim_cache.cache.clear()
+            return plots_page.graphs.__wrapped__(None, None, session_id)
+
+        cases[f'plots_page.graphs[{os.path.splitext(file_name)[0]}]'] = graphs
+    return cases
+
+
+def run(selected: List[str] = None, rounds: int = default_rounds) -> dict:
+    """ :param selected: Only run the benchmarks whose name contains one of these. Default: all.
+    :param rounds: The number of rounds per benchmark.
+    :return: The results by benchmark name, and the environment they were measured in.
+    """
+    results = {}
+    for module in import_budgets:
+        name = f'import[{module}]'
+        if selected and not any(s in name for s in selected):
+            continue
+        results[name] = import_time(module, rounds)
+        print(f'{name:60} {format_time(results[name]["median"]):>10}', file=sys.stderr)
+    for name, function in benchmarks().items():
+        if selected and not any(s in name for s in selected):
+            continue
+        results[name] = measure(function, rounds)
+        print(f'{name:60} {format_time(results[name]["median"]):>10}', file=sys.stderr)
+    return {'environment': {'python': platform.python_version(),
+                            'numpy': np.__version__,
+                            'platform': platform.platform(),
+                            'cpus': os.cpu_count(),
+                            'time': time.strftime('%Y-%m-%dT%H:%M:%S')},
+            'results': results}
+
+
+def compare(results: dict, baseline: dict, threshold: float = default_threshold) -> List[str]:
+    """ Prints the change of every benchmark that is in both runs.
+
+    :param results: The current run.
+    :param baseline: The saved run.
+    :param threshold: The fraction by which the median may get slower.
+    :return: The names of the benchmarks that got slower by more than the threshold.
+    """
+    regressions = []
+    for name, result in results['results'].items():
+        before = baseline['results'].get(name)
+        if before is None:
+            continue
+        ratio = result['median'] / before['median']
+        regressed = ratio > 1 + threshold
+        if regressed:
+            regressions.append(name)
+        print(f'{name:60} {format_time(before["median"]):>10} -> {format_time(result["median"]):>10} '
+              f'{ratio:6.2f}x{"  REGRESSION" if regressed else ""}')
+    return regressions
+
+
+def over_budget(results: dict) -> List[str]:
+    """ :return: The modules whose median import time is over their budget in import_budgets. """
+    failed = []
+    for module, budget in import_budgets.items():
+        result = results['results'].get(f'import[{module}]')
+        if result and result['median'] > budget:
+            failed.append(module)
+            print(f'Importing {module} takes {format_time(result["median"])}, the budget is {format_time(budget)}. '
+                  f'Slowest modules: {", ".join(m["module"] for m in result["top"][:5])}')
+    return failed
+
+
+def format_time(seconds: float) -> str:
+    for unit, scale in (('s', 1), ('ms', 1e-3), ('us', 1e-6)):
+        if seconds >= scale:
+            return f'{seconds / scale:.3g} {unit}'
+    return f'{seconds / 1e-9:.3g} ns'
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description='Runs the benchmarks.')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--compare', help='compare the results with this saved JSON file')
+    parser.add_argument('--threshold', type=float, default=default_threshold,
+                        help='the fraction by which a benchmark may get slower before it counts as a regression')
+    parser.add_argument('--rounds', type=int, default=default_rounds)
+    parser.add_argument('-k', dest='selected', action='append',
+                        help='only run the benchmarks whose name contains this; may be repeated')
+    args = parser.parse_args(argv)
+
+    results = run(args.selected, args.rounds)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    failed = bool(over_budget(results))
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f'{len(regressions)} benchmarks got slower by more than {args.threshold:.0%}')
+            failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
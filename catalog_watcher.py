@@ -0,0 +1,76 @@
+""" Reloads the motors when .eng files are added, changed or removed in the thrust curve folder, without a restart.
+
+The folder is polled rather than watched with file system events, so it works the same on every platform and file
+system, including network drives and mounted volumes. A poll lists the folder and compares the size and mtime of every
+file with the catalog; only the files that differ are parsed again (see thrust_curve.reload_thrust_curves).
+
+Usage::
+
+    from catalog_watcher import CatalogWatcher
+
+    watcher = CatalogWatcher(rebuild_index, interval=5).start()
+"""
+import logging
+import threading
+from typing import Callable, Optional
+
+import thrust_curve as tc
+
+logger = logging.getLogger(__name__)
+
+# The time (s) between two polls of the thrust curve folder
+default_interval = 5.0
+
+
+class CatalogWatcher:
+    def __init__(self, *then: Callable[[], object], interval: float = default_interval):
+        """ Polls the thrust curve folder in a background thread.
+
+        :param then: Functions to call after the motors have been reloaded, e.g. to rebuild indexes of the motors.
+        :param interval: The time between two polls (s).
+        """
+        self.then = then
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def poll(self) -> bool:
+        """ Polls the folder once, and reloads the motors if it changed.
+
+        :return: Whether the motors were reloaded.
+        """
+        try:
+            reloaded = tc.reload_thrust_curves()
+        except OSError as e:
+            # A file was removed or replaced while the folder was read. The next poll sees the result.
+            logger.warning('Could not reload the thrust curves: %s', e)
+            return False
+        if reloaded:
+            for function in self.then:
+                function()
+        return reloaded
+
+    def start(self) -> 'CatalogWatcher':
+        """ Starts polling, unless the watcher is already running.
+
+        :return: The watcher.
+        """
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='thrust-curve-watcher', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """ Stops polling and waits for a reload that is in progress. """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.poll()
+            except Exception:
+                logger.exception('Reloading the thrust curves failed')
@@ -1,16 +1,58 @@
-import pandas as pd
+from typing import Dict, List, Union
 
+import numpy as np
+
+Number = Union[float, np.ndarray]
+
+# The metric prefixes, their names and their powers of ten. '-' is the base unit.
 data = {
     'name': ['yotta', 'zetta', 'exa', 'peta', 'tera', 'giga', 'mega', 'kilo', 'hecto', 'deka', 'base', 'deci', 'centi',
              'milli', 'micro', 'nano', 'pico', 'femto', 'atto', 'zepto', 'yocto'],
     'prefix': ['Y', 'Z', 'E', 'P', 'T', 'G', 'M', 'k', 'h', 'da', '-', 'd', 'c', 'm', 'u', 'n', 'p', 'f', 'a', 'z',
                'y'],
-    'value': [10 ** 24, 10 ** 21, 10 ** 18, 10 ** 15, 10 ** 12, 10 ** 9, 10 ** 6, 10 ** 3, 10 ** 2, 10 ** 1, 10 ** 0,
-              10 ** -1, 10 ** -2, 10 ** -3, 10 ** -6, 10 ** -9, 10 ** -12, 10 ** -15, 10 ** -18, 10 ** -21, 10 ** -24]}
-metric_prefixes = pd.DataFrame(data=data).set_index('prefix')
+    'exponent': [24, 21, 18, 15, 12, 9, 6, 3, 2, 1, 0, -1, -2, -3, -6, -9, -12, -15, -18, -21, -24]}
+prefix_exponents = dict(zip(data['prefix'], data['exponent']))
+
+
+class Conversion:
+    def __init__(self, from_prefix: str, to_prefix: str):
+        """ The conversion of values from one metric prefix to another.
+
+        The factor is a power of ten with an integer exponent. Negative exponents divide by the positive power instead
+        of multiplying by the inexact float (e.g. 4.5 / 100 is exactly 0.045, 4.5 * 0.01 is not).
+
+        :param from_prefix: The metric prefix of the values.
+        :param to_prefix: The metric prefix to convert them to.
+        """
+        if from_prefix not in prefix_exponents or to_prefix not in prefix_exponents:
+            raise ValueError('from_prefix and to_prefix should be valid metric prefixes')
+        self.exponent = prefix_exponents[from_prefix] - prefix_exponents[to_prefix]
+        self.multiply = self.exponent >= 0
+        self.factor = 10.0 ** abs(self.exponent)
+
+    def __call__(self, value: Number) -> Number:
+        """ :param value: A number or an array of numbers.
+        :return: The converted value(s).
+        """
+        if self.exponent == 0:
+            return value
+        return value * self.factor if self.multiply else value / self.factor
+
+
+# Every conversion, built once
+_conversions = {(from_prefix, to_prefix): Conversion(from_prefix, to_prefix)
+                for from_prefix in prefix_exponents for to_prefix in prefix_exponents}
 
 
-def metric_convert(value: float, from_prefix: str, to_prefix: str) -> float:
+def conversion(from_prefix: str, to_prefix: str) -> Conversion:
+    """ :return: The conversion from one metric prefix to another. """
+    try:
+        return _conversions[from_prefix, to_prefix]
+    except KeyError:
+        raise ValueError('from_prefix and to_prefix should be valid metric prefixes') from None
+
+
+def metric_convert(value: Number, from_prefix: str, to_prefix: str) -> Number:
     """ Converts the value to a different metric prefix.
 
     Metric prefixes to be chosen from:
@@ -19,12 +61,53 @@ def metric_convert(value: float, from_prefix: str, to_prefix: str) -> float:
 
     Where '-' is the base unit.
 
-    :param value: The value to be converted.
+    :param value: The value to be converted. A number or a NumPy array.
     :param from_prefix: The metric prefix of the current value's unit.
     :param to_prefix: The metric prefix the value's unit should be in.
     :return: The converted value.
     """
-    if not (from_prefix in metric_prefixes.index and to_prefix in metric_prefixes.index):
-        raise ValueError('from_prefix and to_prefix should be valid metric prefixes')
-    scale_factor = metric_prefixes.loc[from_prefix]['value'] / metric_prefixes.loc[to_prefix]['value']
-    return value * scale_factor
+    return conversion(from_prefix, to_prefix)(value)
+
+
+class InputConversions:
+    def __init__(self, inputs: Dict[str, dict], keys: Dict[str, str] = None):
+        """ The conversions of the inputs of a builder page between the units of the inputs and SI units, looked up
+        once when the page is imported.
+
+        :param inputs: The inputs dict of the page: per input name its unit, default_value, input_prefix and
+        si_prefix.
+        :param keys: The key in rocket-builder-data of every input. Default: the name with underscores.
+        """
+        keys = keys or {}
+        self.names: List[str] = list(inputs)
+        self.keys: List[str] = [keys.get(name, name.replace(' ', '_')) for name in self.names]
+        self._to_si = [conversion(inputs[name]['input_prefix'], inputs[name]['si_prefix']) for name in self.names]
+        self._from_si = [conversion(inputs[name]['si_prefix'], inputs[name]['input_prefix']) for name in self.names]
+        self.defaults = {key: to_si(inputs[name]['default_value'])
+                         for name, key, to_si in zip(self.names, self.keys, self._to_si)}
+
+    def to_si(self, values: List[Number], ndigits: int = None) -> Dict[str, Number]:
+        """ :param values: The value of every input, in the order of the inputs, in the units of the inputs. Values
+        may be arrays, e.g. one value per flight of a batch.
+        :param ndigits: Round the converted values to this many decimals.
+        :return: The values in SI units, by their key in rocket-builder-data.
+        """
+        converted = {}
+        for key, to_si, value in zip(self.keys, self._to_si, values):
+            value = to_si(value)
+            if ndigits is not None:
+                value = np.round(value, ndigits) if isinstance(value, np.ndarray) else round(value, ndigits)
+            converted[key] = value
+        return converted
+
+    def from_si(self, data: dict) -> Dict[str, Number]:
+        """ :param data: rocket-builder-data, or any dict with the keys of the inputs in SI units.
+        :return: The value of every input in the units of the input, by input name.
+        """
+        return {name: from_si(data[key]) for name, key, from_si in zip(self.names, self.keys, self._from_si)}
+
+    def init_data(self, data: dict):
+        """ Adds the default value of every input that is missing from the data, in SI units. """
+        for key, value in self.defaults.items():
+            if key not in data:
+                data[key] = value
@@ -0,0 +1,67 @@
+""" Shape-preserving downsampling of plotted series. """
+from typing import Iterable
+
+import numpy as np
+
+
+def lttb(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """ Largest-Triangle-Three-Buckets: picks the points that keep the visual shape of the series.
+
+    The first and last points are always kept. The points in between are split into n_out - 2 buckets, and from every
+    bucket the point that forms the largest triangle with the point picked from the previous bucket and the average of
+    the next bucket is kept.
+
+    https://skemman.is/bitstream/1946/15343/3/SS_MSthesis.pdf
+
+    :param x: The x values, sorted.
+    :param y: The y values.
+    :param n_out: The number of points to keep.
+    :return: The sorted indices of the kept points. All indices if the series has no more than n_out points.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    # Bucket i holds the points edges[i]:edges[i + 1]; the first and last point are buckets of their own
+    edges = np.concatenate([[0], (1 + np.arange(n_out - 1) * (n - 2) / (n_out - 2)).astype(np.int64), [n]])
+    counts = np.diff(edges)
+    avg_x = np.add.reduceat(x, edges[:-1]) / counts
+    avg_y = np.add.reduceat(y, edges[:-1]) / counts
+
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0] = a = 0
+    for i in range(1, n_out - 1):
+        start, end = edges[i], edges[i + 1]
+        # Twice the area of the triangles with the previous point and the average of the next bucket
+        area = np.abs((x[a] - avg_x[i + 1]) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y[i + 1] - y[a]))
+        a = start + int(np.argmax(area))
+        selected[i] = a
+    selected[-1] = n - 1
+    return selected
+
+
+def downsample(x: np.ndarray, y: np.ndarray, budget: int, keep: Iterable[int] = ()) -> np.ndarray:
+    """ Downsamples the series with lttb, always keeping some points exactly.
+
+    :param x: The x values, sorted.
+    :param y: The y values.
+    :param budget: The maximum number of points. The kept points count towards it.
+    :param keep: The indices of points that must be kept, e.g. events.
+    :return: The sorted indices of the points to plot.
+    """
+    keep = np.unique(np.asarray(list(keep), dtype=np.int64))
+    return np.union1d(lttb(x, y, max(budget - len(keep), 3)), keep)
+
+
+def nearest_indices(x: np.ndarray, values: Iterable[float]) -> np.ndarray:
+    """ :param x: The x values, sorted.
+    :param values: The x values to look up, e.g. the times of events.
+    :return: The index of the point closest to every value.
+    """
+    values = np.asarray(list(values), dtype=float)
+    if not len(x) or not len(values):
+        return np.empty(0, dtype=np.int64)
+    right = np.clip(np.searchsorted(x, values), 1, len(x) - 1) if len(x) > 1 else np.zeros(len(values), np.int64)
+    left = np.maximum(right - 1, 0)
+    return np.where(np.abs(x[left] - values) <= np.abs(x[right] - values), left, right)
@@ -1,13 +1,21 @@
+import os
+import threading
+
 import dash_bootstrap_components as dbc
 import dash_core_components as dcc
 import dash_html_components as html
 from dash.dependencies import Input, Output, State
+from dash.exceptions import PreventUpdate
 
+import metrics
+import thrust_curve as tc
 from app import app
-from pages import thrust_curve_page as tc_page, page404, home_page, plots_page
+from catalog_watcher import CatalogWatcher, default_interval
+from pages import thrust_curve_page as tc_page, page404, home_page, plots_page, motor_sweep_page
 from pages.rocket_builder import rocket_builder_page as rb_page
+from session_store import new_session_id, session_store
 
-all_pages = [tc_page, rb_page, plots_page]
+all_pages = [tc_page, rb_page, plots_page, motor_sweep_page]
 
 navbar = dbc.NavbarSimple(
     children=[
@@ -24,6 +32,10 @@ navbar = dbc.NavbarSimple(
 )
 
 app.layout = html.Div([
+    # The key of the server-side session state, see session_store.py
+    dcc.Store(id='session-key', storage_type='session'),
+    # Small stores that change with the motor and the rocket of the session: the file name of the motor, and the
+    # dimensions of the rocket for the rocket drawing
     dcc.Store(id='thrust-curve-data', storage_type='session'),
     dcc.Store(id='rocket-builder-data', storage_type='session'),
     dcc.Location(id='url', refresh=False),
@@ -32,31 +44,72 @@ app.layout = html.Div([
 ])
 
 
+@app.callback(
+    Output('session-key', 'data'),
+    Input('url', 'pathname'),
+    State('session-key', 'data'))
+def init_session(pathname, session_id):
+    """ Gives a new browser session its session key. """
+    if session_id:
+        raise PreventUpdate
+    return new_session_id()
+
+
 @app.callback(
     Output('page-content', 'children'),
     Input('url', 'pathname'),
-    State('thrust-curve-data', 'data'),
-    State('rocket-builder-data', 'data'))
-def display_page(pathname, tc_data, rb_data):
+    Input('session-key', 'data'))
+def display_page(pathname, session_id):
     """Displays the page that corresponds to the given pathname.
 
     :param pathname: The current pathname (the last part of the URL) of the page.
-    :param tc_data:
-    :param rb_data:
+    :param session_id: The session key. The motor and the rocket of the session are loaded from the session store.
     :return: The page that should be at that pathname; otherwise a 404 page.
     """
     if pathname == '/':
         return home_page.layout
     elif pathname == tc_page.pathname:
-        return tc_page.get_layout(tc_data)
+        return tc_page.get_layout(session_store.get(session_id, 'motor'))
     elif pathname.startswith(rb_page.pathname):
-        return rb_page.get_layout(rb_data, pathname)
+        return rb_page.get_layout(session_store.get(session_id, 'rocket'), pathname)
     elif pathname == plots_page.pathname:
-        return plots_page.get_layout()
+        return plots_page.get_layout(session_id)
+    elif pathname == motor_sweep_page.pathname:
+        return motor_sweep_page.get_layout()
     else:
         return page404.layout
 
 
+# After all callbacks have been registered
+if metrics.enabled:
+    metrics.instrument(app)
+
+# How the motors are loaded (WARP_STARTUP):
+# warmup: in a background thread that starts now, so the app starts serving at once (default)
+# lazy: on the first request that needs them
+# eager: before the app starts serving
+startup_mode = os.environ.get('WARP_STARTUP', 'warmup')
+ready = threading.Event()
+if startup_mode == 'warmup':
+    tc.start_warmup(tc_page.catalog_view, ready.set)
+else:
+    if startup_mode == 'eager':
+        tc_page.catalog_view()
+    ready.set()
+
+# Poll thrustcurve/ every WARP_CATALOG_POLL seconds, and reload the motors and the dropdown of the thrust curve page
+# when .eng files were added, changed or removed. 0 turns it off.
+catalog_poll = float(os.environ.get('WARP_CATALOG_POLL', default_interval))
+if catalog_poll > 0:
+    catalog_watcher = CatalogWatcher(tc_page.reload_catalog_view, interval=catalog_poll).start()
+
+
+@app.server.route('/ready')
+def readiness():
+    """ Readiness probe: 503 until the warm-up has finished. """
+    return ('ready', 200) if ready.is_set() else ('warming up', 503)
+
+
 if __name__ == '__main__':
     app.run_server(debug=True)
     # app.run_server(debug=False, port=8080, host='0.0.0.0')  # Run on LAN (replace host with your IP address)
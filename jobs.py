@@ -0,0 +1,196 @@
+""" Background jobs: long simulations run in a process pool while the callbacks that submitted them return at once.
+
+A job is a list of independent chunks. Each chunk is a picklable function and its arguments, and runs in the pool.
+The page polls the job with a dcc.Interval, and can show the chunks that have finished so far, combined by the
+function that was given when the job was submitted.
+
+The job table lives in the web process, so a job can only be polled from the process that runs it.
+"""
+import threading
+import time
+import uuid
+from concurrent.futures import CancelledError, Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+FINISHED = (DONE, FAILED, CANCELLED)
+
+
+class JobLimitError(RuntimeError):
+    """ The session already has the maximum number of unfinished jobs. """
+
+
+@dataclass
+class Job:
+    job_id: str
+    session_id: str
+    kind: str
+    combine: Callable[[List[Any]], Any]  # Combines the results of the finished chunks, in chunk order
+    results: List[Any]  # The result of every chunk, None until it has finished
+    futures: List[Future] = field(default_factory=list)
+    completed: int = 0
+    status: str = QUEUED
+    error: str = ''
+    created: float = field(default_factory=time.time)
+    finished: Optional[float] = None
+
+    @property
+    def progress(self) -> float:
+        """ :return: The fraction of the chunks that have finished. """
+        return self.completed / len(self.results) if self.results else 1.0
+
+
+class JobManager:
+    def __init__(self, workers: int = None, max_jobs_per_session: int = 2, keep_finished: float = 3600):
+        """ Runs jobs in a process pool that is started with the first job.
+
+        :param workers: The number of processes. Default: the number of CPUs.
+        :param max_jobs_per_session: The number of unfinished jobs a session may have.
+        :param keep_finished: Finished jobs are forgotten this long (s) after they finished.
+        """
+        self.workers = workers
+        self.max_jobs_per_session = max_jobs_per_session
+        self.keep_finished = keep_finished
+        self._jobs: Dict[str, Job] = {}
+        self._executor = None
+        # Reentrant: cancelling a future runs its done callback, which takes the lock, in the cancelling thread
+        self._lock = threading.RLock()
+
+    def submit(self, session_id: str, kind: str, chunks: List[Tuple[Callable, tuple]],
+               combine: Callable[[List[Any]], Any]) -> str:
+        """ Starts a job.
+
+        :param session_id: The session that owns the job.
+        :param kind: What the job computes, e.g. 'monte_carlo'.
+        :param chunks: The function and arguments of every chunk. They must be picklable.
+        :param combine: Combines a list of chunk results into the result of the job. Also called with the results of
+        the chunks that have finished so far.
+        :return: The id of the job.
+        :raises JobLimitError: If the session already has max_jobs_per_session unfinished jobs.
+        :raises BrokenProcessPool: If the pool broke again right after it was restarted.
+        """
+        with self._lock:
+            self._forget_old()
+            if len(self.jobs(session_id, unfinished=True)) >= self.max_jobs_per_session:
+                raise JobLimitError(f'A session can run at most {self.max_jobs_per_session} jobs at once')
+            job = Job(uuid.uuid4().hex, session_id, kind, combine, [None] * len(chunks))
+            try:
+                job.futures = self._submit_chunks(chunks)
+            except BrokenProcessPool:
+                # A worker died (e.g. out of memory) and took the pool with it: start a new pool and try once more
+                self._stop_executor()
+                job.futures = self._submit_chunks(chunks)
+            if not chunks:
+                job.status, job.finished = DONE, time.time()
+            for i, future in enumerate(job.futures):
+                future.add_done_callback(lambda f, i=i: self._chunk_done(job, i, f))
+            # Only jobs whose chunks are all submitted count, also against the limit of the session
+            self._jobs[job.job_id] = job
+        return job.job_id
+
+    def _submit_chunks(self, chunks: List[Tuple[Callable, tuple]]) -> List[Future]:
+        """ :return: The futures of the chunks, submitted to the pool. If that fails, the ones that were submitted
+        are cancelled.
+        """
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        futures = []
+        try:
+            for function, args in chunks:
+                futures.append(self._executor.submit(function, *args))
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+        return futures
+
+    def _stop_executor(self):
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+    def _chunk_done(self, job: Job, i: int, future: Future):
+        with self._lock:
+            if job.status in FINISHED:
+                return
+            try:
+                job.results[i] = future.result()
+            except CancelledError:
+                return
+            except Exception as e:
+                job.status, job.error, job.finished = FAILED, repr(e), time.time()
+                self._cancel_futures(job)
+                return
+            job.completed += 1
+            job.status = RUNNING
+            if job.completed == len(job.results):
+                job.status, job.finished = DONE, time.time()
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """ :return: The job, or None if it doesn't exist (anymore). """
+        return self._jobs.get(job_id)
+
+    def jobs(self, session_id: str, unfinished: bool = False) -> List[Job]:
+        """ :return: The jobs of the session, optionally only the unfinished ones. """
+        return [job for job in list(self._jobs.values())
+                if job.session_id == session_id and not (unfinished and job.status in FINISHED)]
+
+    def status(self, job_id: str) -> dict:
+        """ :return: The status, the progress (0 to 1) and the error of the job. The status of unknown jobs is None. """
+        job = self.get(job_id)
+        if job is None:
+            return {'status': None, 'progress': 0.0, 'error': ''}
+        return {'status': job.status, 'progress': job.progress, 'error': job.error}
+
+    def partial_result(self, job_id: str) -> Any:
+        """ :return: The combined results of the chunks that have finished so far, or None if none have. """
+        job = self.get(job_id)
+        if job is None:
+            return None
+        with self._lock:
+            results = [result for result in job.results if result is not None]
+        return job.combine(results) if results else None
+
+    def result(self, job_id: str) -> Any:
+        """ :return: The result of the job, or None if it hasn't finished successfully. """
+        job = self.get(job_id)
+        if job is None or job.status != DONE:
+            return None
+        return job.combine(job.results)
+
+    def cancel(self, job_id: str):
+        """ Cancels the chunks that haven't started. Chunks that are running finish, but their results are dropped. """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.status in FINISHED:
+                return
+            job.status, job.finished = CANCELLED, time.time()
+            self._cancel_futures(job)
+
+    def shutdown(self):
+        """ Cancels all jobs and stops the pool. """
+        for job_id in list(self._jobs):
+            self.cancel(job_id)
+        with self._lock:
+            self._stop_executor()
+
+    @staticmethod
+    def _cancel_futures(job: Job):
+        for future in job.futures:
+            future.cancel()
+
+    def _forget_old(self):
+        now = time.time()
+        for job_id, job in list(self._jobs.items()):
+            if job.finished is not None and now - job.finished > self.keep_finished:
+                del self._jobs[job_id]
+
+
+# The job manager of the app
+job_manager = JobManager()
@@ -0,0 +1,151 @@
+""" Latency and payload metrics of the Dash callbacks, served in the Prometheus text format on /metrics.
+
+Set the environment variable WARP_METRICS=1 to turn the metrics on. Without it the callbacks aren't wrapped at all and
+there is no /metrics route, so the metrics cost nothing when nobody scrapes them.
+
+Only server-side callbacks are measured. Clientside callbacks, like the rocket drawing, run in the browser.
+"""
+import functools
+import os
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List
+
+from dash.exceptions import PreventUpdate
+
+enabled = os.environ.get('WARP_METRICS', '').lower() in ('1', 'true', 'yes')
+
+# The upper bounds of the histogram buckets: latency in s and payload size in bytes
+latency_buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+payload_buckets = (1e3, 1e4, 1e5, 3e5, 1e6, 3e6, 1e7)
+
+
+class Histogram:
+    def __init__(self, buckets: tuple):
+        """ A Prometheus histogram: the number of observations per bucket, their count and their sum. """
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # The last bucket is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def lines(self, name: str, labels: str) -> List[str]:
+        """ :return: The bucket, sum and count lines in the Prometheus text format. """
+        lines = []
+        cumulative = 0
+        for bound, count in zip([f'{bound:g}' for bound in self.buckets] + ['+Inf'], self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_sum{{{labels}}} {self.sum:.6g}')
+        lines.append(f'{name}_count{{{labels}}} {self.count}')
+        return lines
+
+
+class CallbackMetrics:
+    def __init__(self):
+        """ The calls, prevented updates, exceptions, latency and payload size of every callback. """
+        self.latency: Dict[str, Histogram] = {}
+        self.payload: Dict[str, Histogram] = {}
+        self.prevented: Dict[str, int] = {}
+        self.exceptions: Dict[tuple, int] = {}  # (callback, exception type) -> count
+        self._lock = threading.Lock()
+
+    def observe(self, name: str, latency: float, payload: int = None, exception: str = None,
+                prevented: bool = False):
+        """ Records one call of the callback.
+
+        :param name: The name of the callback.
+        :param latency: The duration of the call (s).
+        :param payload: The size of the response (bytes), if the call returned one.
+        :param exception: The type of the exception that the call raised, if any.
+        :param prevented: Whether the call raised PreventUpdate.
+        """
+        with self._lock:
+            if name not in self.latency:
+                self.latency[name] = Histogram(latency_buckets)
+                self.payload[name] = Histogram(payload_buckets)
+                self.prevented[name] = 0
+            self.latency[name].observe(latency)
+            if payload is not None:
+                self.payload[name].observe(payload)
+            if prevented:
+                self.prevented[name] += 1
+            if exception:
+                self.exceptions[name, exception] = self.exceptions.get((name, exception), 0) + 1
+
+    def render(self) -> str:
+        """ :return: All metrics in the Prometheus text format. """
+        with self._lock:
+            lines = ['# HELP warp_callback_latency_seconds The duration of the Dash callbacks.',
+                     '# TYPE warp_callback_latency_seconds histogram']
+            for name, histogram in sorted(self.latency.items()):
+                lines.extend(histogram.lines('warp_callback_latency_seconds', f'callback="{name}"'))
+            lines.extend(['# HELP warp_callback_payload_bytes The size of the responses of the Dash callbacks.',
+                          '# TYPE warp_callback_payload_bytes histogram'])
+            for name, histogram in sorted(self.payload.items()):
+                lines.extend(histogram.lines('warp_callback_payload_bytes', f'callback="{name}"'))
+            lines.extend(['# HELP warp_callback_prevented_total The calls that raised PreventUpdate.',
+                          '# TYPE warp_callback_prevented_total counter'])
+            lines.extend(f'warp_callback_prevented_total{{callback="{name}"}} {count}'
+                         for name, count in sorted(self.prevented.items()))
+            lines.extend(['# HELP warp_callback_exceptions_total The calls that raised an exception.',
+                          '# TYPE warp_callback_exceptions_total counter'])
+            lines.extend(f'warp_callback_exceptions_total{{callback="{name}",exception="{exception}"}} {count}'
+                         for (name, exception), count in sorted(self.exceptions.items()))
+        return '\n'.join(lines) + '\n'
+
+
+def timed(function: Callable, name: str, metrics: 'CallbackMetrics') -> Callable:
+    """ :return: The function, recording every call in the metrics. The function returns the JSON response. """
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = function(*args, **kwargs)
+        except PreventUpdate:
+            metrics.observe(name, time.perf_counter() - start, prevented=True)
+            raise
+        except Exception as e:
+            metrics.observe(name, time.perf_counter() - start, exception=type(e).__name__)
+            raise
+        # The size in bytes: a str response is counted once encoded, as it is sent, not in characters
+        size = len(response.encode()) if isinstance(response, str) else len(response)
+        metrics.observe(name, time.perf_counter() - start, payload=size)
+        return response
+
+    return wrapper
+
+
+def instrument(app, metrics: 'CallbackMetrics' = None, route: str = '/metrics') -> 'CallbackMetrics':
+    """ Wraps every server-side callback that is registered so far, and serves the metrics on the route of the Flask
+    server of the app. Call it once, after all pages have been imported.
+
+    :param app: The Dash app.
+    :param metrics: Where to record the calls. Default: the module-level callback_metrics.
+    :param route: The path of the metrics.
+    :return: The metrics.
+    """
+    metrics = metrics or callback_metrics
+    for entry in app.callback_map.values():
+        function = entry.get('callback')  # Clientside callbacks have none
+        if function is None or getattr(function, 'metrics', None) is metrics:
+            continue
+        user_function = getattr(function, '__wrapped__', function)
+        entry['callback'] = timed(function, f'{user_function.__module__}.{user_function.__name__}', metrics)
+        entry['callback'].metrics = metrics
+
+    def serve_metrics():
+        return metrics.render(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+    if route not in {rule.rule for rule in app.server.url_map.iter_rules()}:
+        app.server.add_url_rule(route, 'metrics', serve_metrics)
+    return metrics
+
+
+# The metrics of the app
+callback_metrics = CallbackMetrics()
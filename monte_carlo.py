@@ -0,0 +1,190 @@
+""" Monte Carlo dispersion analysis: many flights of one rocket and motor with uncertain parameters.
+
+Usage from a script::
+
+    import thrust_curve as tc
+    from monte_carlo import Normal, run_monte_carlo
+    from simulation import Motor, Rocket
+
+    motor = Motor.from_thrust_curve(tc.get_thrust_curve('Estes_D12.eng'))
+    result = run_monte_carlo(Rocket(mass=0.1, diameter=0.035, parachute_diameter=0.3), motor,
+                             {'mass': Normal(0.1, 0.002), 'impulse_scale': Normal(1, 0.03)}, samples=100000)
+    print(result.percentiles()['apogee'])
+"""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from simulation import BatchSummary, Motor, Rocket, SimConfig, simulate_batch
+
+# The parameters that can be dispersed, with the smallest value a sample may take. impulse_scale multiplies the thrust
+# of the motor; the others are the Rocket attributes of the same name. Drag coefficients stay positive, because 0
+# stands for the default drag coefficient.
+parameters = {'mass': 1e-6,
+              'drag_coefficient': 1e-6,
+              'parachute_drag_coefficient': 1e-6,
+              'parachute_deploy_delay': 0.0,
+              'impulse_scale': 0.0}
+# The summaries that are reported, see simulation.BatchSummary
+outputs = ('apogee', 'max_velocity', 'max_acceleration', 'flight_time', 'landing_speed')
+default_percentiles = (1, 5, 25, 50, 75, 95, 99)
+
+# The number of processes that run the chunks
+pool_workers = os.cpu_count()
+
+
+@dataclass
+class Normal:
+    mean: float
+    std: float
+
+    def sample(self, rng: np.random.Generator, n: int) -> np.ndarray:
+        return rng.normal(self.mean, self.std, n)
+
+
+@dataclass
+class Uniform:
+    low: float
+    high: float
+
+    def sample(self, rng: np.random.Generator, n: int) -> np.ndarray:
+        return rng.uniform(self.low, self.high, n)
+
+
+@dataclass
+class MonteCarloResult:
+    summary: BatchSummary  # One element per sampled flight, in sample order
+    samples: Dict[str, np.ndarray]  # The sampled value of every dispersed parameter
+    seed: int
+
+    def __len__(self):
+        return len(self.summary)
+
+    def percentiles(self, q: Sequence[float] = default_percentiles) -> Dict[str, Dict[str, float]]:
+        """ Flights that haven't landed before max_time are left out of the landing speed percentiles.
+
+        :param q: The percentiles to calculate.
+        :return: Maps every output to its percentiles by name (e.g. 'p50'), its mean and its standard deviation.
+        """
+        stats = {}
+        for name in outputs:
+            values = getattr(self.summary, name)
+            values = values[np.isfinite(values)]
+            if not len(values):
+                stats[name] = {}
+                continue
+            stats[name] = {f'p{p:g}': value for p, value in zip(q, np.percentile(values, q).tolist())}
+            stats[name]['mean'] = float(values.mean())
+            stats[name]['std'] = float(values.std())
+        return stats
+
+
+def run_monte_carlo(rocket: Rocket, motor: Motor, dispersions: Dict[str, object], samples: int = 10000,
+                    seed: int = 0, chunk_size: int = 20000, workers: int = None,
+                    config: SimConfig = None) -> MonteCarloResult:
+    """ Simulates the rocket with randomly dispersed parameters.
+
+    The samples are split into chunks that are simulated with simulate_batch, spread across a process pool. Every
+    chunk draws from its own stream spawned from the seed, so the results only depend on the seed and the chunk size,
+    not on the number of workers.
+
+    :param rocket: The nominal rocket. Parameters without a dispersion keep its value.
+    :param motor: The motor.
+    :param dispersions: Maps the names in parameters to a distribution (Normal or Uniform) of their values.
+    :param samples: The number of flights.
+    :param seed: The seed of the random streams.
+    :param chunk_size: The number of flights per task.
+    :param workers: The number of processes. Default: pool_workers.
+    :param config: The simulation settings.
+    :return: The summaries of all flights.
+    """
+    workers = workers or pool_workers or 1
+    tasks = chunk_tasks(rocket, motor, dispersions, samples, seed, chunk_size, config)
+    # Never start a pool from a pool worker
+    if workers == 1 or len(tasks) < 2 or multiprocessing.parent_process() is not None:
+        results = [run_chunk(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as executor:
+            results = list(executor.map(run_chunk, tasks))
+    return combine_chunks(results, list(dispersions), seed)
+
+
+def chunk_tasks(rocket: Rocket, motor: Motor, dispersions: Dict[str, object], samples: int, seed: int = 0,
+                chunk_size: int = 20000, config: SimConfig = None) -> List[tuple]:
+    """ Splits a Monte Carlo analysis into independent chunks, for running them elsewhere, e.g. as a background job.
+    Takes the arguments of run_monte_carlo.
+
+    :return: The argument of run_chunk for every chunk.
+    """
+    unknown = set(dispersions) - set(parameters)
+    if unknown:
+        raise ValueError(f'Unknown parameters {sorted(unknown)}, expected some of {list(parameters)}')
+    sizes = [min(chunk_size, samples - start) for start in range(0, samples, chunk_size)]
+    streams = np.random.SeedSequence(seed).spawn(len(sizes))
+    return [(rocket, motor, dispersions, size, stream, config) for size, stream in zip(sizes, streams)]
+
+
+def combine_chunks(results: List[Tuple[BatchSummary, Dict[str, np.ndarray]]], names: List[str],
+                   seed: int) -> MonteCarloResult:
+    """ :param results: The results of run_chunk, in chunk order. May be only the chunks that have finished so far.
+    :param names: The names of the dispersed parameters.
+    :param seed: The seed of the analysis.
+    :return: The result of the chunks.
+    """
+    summaries = [summary for summary, _ in results]
+    summary = BatchSummary(*(np.concatenate([getattr(s, name) for s in summaries]) if summaries else np.empty(0)
+                             for name in BatchSummary.__dataclass_fields__))
+    drawn = {name: np.concatenate([chunk[name] for _, chunk in results]) if results else np.empty(0)
+             for name in names}
+    return MonteCarloResult(summary, drawn, seed)
+
+
+def run_chunk(task: Tuple[Rocket, Motor, Dict[str, object], int, np.random.SeedSequence, SimConfig]) \
+        -> Tuple[BatchSummary, Dict[str, np.ndarray]]:
+    rocket, motor, dispersions, n, stream, config = task
+    # Every parameter draws from its own child stream, by its position in parameters, so adding a dispersion doesn't
+    # change the samples of the others
+    drawn = {}
+    for i, (name, lowest) in enumerate(parameters.items()):
+        if name in dispersions:
+            rng = np.random.default_rng(np.random.SeedSequence(stream.entropy, spawn_key=stream.spawn_key + (i,)))
+            drawn[name] = np.maximum(dispersions[name].sample(rng, n), lowest)
+    values = {name: drawn.get(name, getattr(rocket, name, 1)) for name in parameters}
+    summary = simulate_batch([motor], values['mass'], rocket.diameter, rocket.parachute_diameter,
+                             values['parachute_drag_coefficient'], values['parachute_deploy_delay'],
+                             drag_coefficient=values['drag_coefficient'], thrust_scale=values['impulse_scale'],
+                             config=config)
+    return summary, drawn
+
+
+def relative_dispersions(rocket: Rocket, mass: float = 0, drag_coefficient: float = 0,
+                         parachute_drag_coefficient: float = 0, parachute_deploy_delay: float = 0,
+                         impulse_scale: float = 0) -> Dict[str, Normal]:
+    """ Normal dispersions around the nominal rocket. Parameters with a standard deviation of 0 are left out.
+
+    :param mass: The standard deviation of the mass, in % of the nominal mass.
+    :param drag_coefficient: The standard deviation of the drag coefficient, in %.
+    :param parachute_drag_coefficient: The standard deviation of the chute drag coefficient, in %.
+    :param parachute_deploy_delay: The standard deviation of the deploy delay, in s.
+    :param impulse_scale: The standard deviation of the total impulse, in %.
+    :return: The dispersions for run_monte_carlo.
+    """
+    dispersions = {}
+    for name, std in (('mass', mass), ('drag_coefficient', drag_coefficient),
+                      ('parachute_drag_coefficient', parachute_drag_coefficient), ('impulse_scale', impulse_scale)):
+        if std:
+            mean = getattr(rocket, name, 1)
+            dispersions[name] = Normal(mean, mean * std / 100)
+    if parachute_deploy_delay:
+        dispersions['parachute_deploy_delay'] = Normal(rocket.parachute_deploy_delay, parachute_deploy_delay)
+    return dispersions
+
+
+def percentile_table(result: MonteCarloResult, q: Sequence[float] = default_percentiles) -> List[dict]:
+    """ :return: One row per output with its percentiles, mean and standard deviation, rounded for display. """
+    return [{'output': name, **{key: round(value, 3) for key, value in stats.items()}}
+            for name, stats in result.percentiles(q).items()]
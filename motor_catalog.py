@@ -0,0 +1,124 @@
+import hashlib
+import json
+import os
+import struct
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Bump whenever the layout of the file or the meaning of a header field changes. Catalogs with another version are
+# treated as stale and rebuilt.
+CATALOG_VERSION = 2
+MAGIC = b'WARPCAT\0'
+# magic, version, header length
+_PREAMBLE = struct.Struct('<8sII')
+_ALIGNMENT = 8
+
+
+class MotorCatalog:
+    def __init__(self, records: List[dict], points: np.ndarray, sources: Dict[str, list],
+                 errors: Dict[str, str] = None):
+        """ A compiled motor catalog.
+
+        :param records: One header record per .eng file. Each record holds the parsed header, the summary metrics,
+        the content hash of the file, the hash of its thrust curve and the slice (offset, count) of its points in the
+        points array.
+        :param points: A (n, 2) float64 array with the time (s) and thrust (N) points of all unique thrust curves.
+        :param sources: Maps every file name to its [size, mtime_ns] at the time the catalog was built. Files that
+        could not be parsed are included, so they don't make the catalog stale.
+        :param errors: Maps the file name of every file that could not be parsed to the error.
+        """
+        self.records = records
+        self.points = points
+        self.sources = sources
+        self.errors = errors or {}
+
+    def curve(self, record: dict) -> Tuple[np.ndarray, np.ndarray]:
+        """ :return: The times and thrusts of the thrust curve of the record as read-only views into the catalog. """
+        pts = self.points[record['offset']:record['offset'] + record['count']]
+        return pts[:, 0], pts[:, 1]
+
+    def duplicates(self) -> Dict[str, str]:
+        """ :return: Maps the file name of every duplicate thrust curve to the file it duplicates. """
+        return {r['file_name']: r['duplicate_of'] for r in self.records if r['duplicate_of']}
+
+    def is_stale(self, folder: str, file_names: List[str]) -> bool:
+        """ Checks whether any file in the folder was added, removed or changed since the catalog was built.
+
+        :param folder: The folder with the .eng files.
+        :param file_names: The .eng files that are currently in the folder.
+        :return: True if the catalog has to be rebuilt.
+        """
+        return self.sources != source_signature(folder, file_names)
+
+
+def content_hash(data: bytes) -> str:
+    """ :return: The hex digest that identifies a thrust curve file by its content. """
+    return hashlib.sha1(data).hexdigest()
+
+
+def curve_hash(points: np.ndarray) -> str:
+    """ :return: The hex digest that identifies a thrust curve by its time and thrust points only. Files that differ
+    only in comments or header (e.g. corrected masses) have the same curve hash.
+    """
+    return hashlib.sha1(np.ascontiguousarray(points, dtype='<f8').tobytes()).hexdigest()
+
+
+def source_signature(folder: str, file_names: List[str]) -> Dict[str, list]:
+    """ :return: Maps every file name to its [size, mtime_ns]. """
+    signature = {}
+    for file_name in file_names:
+        stat = os.stat(os.path.join(folder, file_name))
+        signature[file_name] = [stat.st_size, stat.st_mtime_ns]
+    return signature
+
+
+def write_catalog(path: str, catalog: MotorCatalog):
+    """ Writes the catalog to a single file. The file is replaced atomically so that other processes never see a
+    partially written catalog.
+
+    Layout: magic, version and header length, a JSON header (records, sources and errors) padded with spaces up to an
+    8-byte boundary and finally the packed little-endian float64 points.
+
+    :param path: The file to write to.
+    :param catalog: The catalog to write.
+    """
+    header = json.dumps({'records': catalog.records,
+                         'sources': catalog.sources,
+                         'errors': catalog.errors}).encode('utf-8')
+    header += b' ' * (-(_PREAMBLE.size + len(header)) % _ALIGNMENT)
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(_PREAMBLE.pack(MAGIC, CATALOG_VERSION, len(header)))
+        f.write(header)
+        f.write(np.ascontiguousarray(catalog.points, dtype='<f8').tobytes())
+    os.replace(tmp_path, path)
+
+
+def load_catalog(path: str) -> Optional[MotorCatalog]:
+    """ Loads a catalog written by write_catalog. The points are memory-mapped where possible.
+
+    :param path: The catalog file.
+    :return: The catalog, or None if the file does not exist, is corrupt or has another version.
+    """
+    try:
+        with open(path, 'rb') as f:
+            magic, version, header_len = _PREAMBLE.unpack(f.read(_PREAMBLE.size))
+            if magic != MAGIC or version != CATALOG_VERSION:
+                return None
+            header = json.loads(f.read(header_len).decode('utf-8'))
+    except (OSError, ValueError, struct.error):
+        return None
+
+    offset = _PREAMBLE.size + header_len
+    n_values = (os.path.getsize(path) - offset) // 8
+    if n_values % 2:
+        return None
+    try:
+        points = np.memmap(path, dtype='<f8', mode='r', offset=offset, shape=(n_values // 2, 2))
+    except (OSError, ValueError):
+        # Empty catalogs can't be mapped, and some platforms refuse to map files on network drives
+        points = np.fromfile(path, dtype='<f8', offset=offset).reshape(-1, 2)
+    return MotorCatalog(header['records'], points, header['sources'], header.get('errors'))
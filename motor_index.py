@@ -0,0 +1,103 @@
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# The numeric ThrustCurve attributes that can be queried by range.
+range_columns = ['diameter', 'length', 'impulse', 'avg_thrust', 'burn_time']
+
+
+class MotorIndex:
+    def __init__(self, thrust_curves: list):
+        """ A columnar index of the motor catalog for fast filtering.
+
+        Every numeric attribute is stored as a NumPy column together with a sorted copy and the permutation that sorts
+        it, so the rows within a range are found with two binary searches. Manufacturers are stored as integer codes
+        with the rows of every manufacturer precomputed.
+
+        :param thrust_curves: The motors to index. Row i of the index is thrust_curves[i].
+        """
+        self.file_names = [tc.file_name for tc in thrust_curves]
+        # The dropdown options, built once and shared by every query result.
+        self.options = [{'label': str(tc), 'value': tc.file_name} for tc in thrust_curves]
+        self.manufacturers = sorted({tc.manufacturer for tc in thrust_curves})
+        codes = {m: i for i, m in enumerate(self.manufacturers)}
+        self.manufacturer_codes = np.array([codes[tc.manufacturer] for tc in thrust_curves], dtype=np.int32)
+        self._manufacturer_rows = [np.flatnonzero(self.manufacturer_codes == i) for i in range(len(codes))]
+
+        self.columns = {}
+        self._sorted = {}
+        for name in range_columns:
+            values = np.array([getattr(tc, name) for tc in thrust_curves], dtype=float)
+            order = np.argsort(values, kind='stable')
+            self.columns[name] = values
+            self._sorted[name] = (order, values[order])
+
+    def __len__(self):
+        return len(self.file_names)
+
+    def unique(self, column: str) -> List[float]:
+        """ :return: The sorted unique values of the column. """
+        return np.unique(self.columns[column]).tolist()
+
+    def value_range(self, column: str) -> List[float]:
+        """ :return: The min and max value of the column. """
+        values = self._sorted[column][1]
+        return [values[0].item(), values[-1].item()]
+
+    def query(self, manufacturer: Optional[str] = None, **ranges: Tuple[float, float]) -> np.ndarray:
+        """ Finds the motors that match all filters.
+
+        The most selective filter is found first from the binary search counts; only its rows are compared against the
+        other filters, so the cost scales with the smallest match instead of with the size of the catalog.
+
+        :param manufacturer: Only include motors of this manufacturer. Default: all manufacturers.
+        :param ranges: Inclusive (low, high) ranges by column name, e.g. impulse=(10, 40).
+        :return: The sorted row ids of the matching motors.
+        """
+        candidates = []  # (number of rows, rows)
+        if manufacturer is not None:
+            if manufacturer not in self.manufacturers:
+                return np.empty(0, dtype=np.int64)
+            rows = self._manufacturer_rows[self.manufacturers.index(manufacturer)]
+            candidates.append((len(rows), rows))
+        bounds = {}
+        for column, (low, high) in ranges.items():
+            order, values = self._sorted[column]
+            lo = np.searchsorted(values, low, 'left')
+            hi = np.searchsorted(values, high, 'right')
+            if hi - lo == len(self):
+                continue  # Every motor is in range
+            bounds[column] = (low, high)
+            candidates.append((max(hi - lo, 0), (column, order, lo, hi)))
+        if not candidates:
+            return np.arange(len(self))
+
+        size, best = min(candidates, key=lambda c: c[0])
+        if size == 0:
+            return np.empty(0, dtype=np.int64)
+        if isinstance(best, tuple):
+            column, order, lo, hi = best
+            if size > len(self) // 8:
+                # Marking a bitmap is cheaper than sorting many row ids
+                hits = np.zeros(len(self), dtype=bool)
+                hits[order[lo:hi]] = True
+                rows = np.flatnonzero(hits)
+            else:
+                rows = np.sort(order[lo:hi])
+            del bounds[column]
+        else:
+            rows = best
+            manufacturer = None
+
+        mask = np.ones(len(rows), dtype=bool)
+        if manufacturer is not None:
+            mask &= self.manufacturer_codes[rows] == self.manufacturers.index(manufacturer)
+        for column, (low, high) in bounds.items():
+            values = self.columns[column][rows]
+            mask &= (values >= low) & (values <= high)
+        return rows[mask]
+
+    def query_options(self, manufacturer: Optional[str] = None, **ranges: Tuple[float, float]) -> List[Dict[str, str]]:
+        """ :return: The dropdown options of the motors that match all filters. See query. """
+        options = self.options
+        return [options[i] for i in self.query(manufacturer, **ranges).tolist()]
@@ -0,0 +1,72 @@
+""" Simulates one rocket with every motor that fits it. """
+from typing import List, Optional
+
+import numpy as np
+
+from constants import g
+from sim_cache import simulate_batch_cached
+from simulation import Motor, Rocket, SimConfig
+
+# The wall thickness of the body tube (m). The diameter of the rocket is the outer diameter of the tube.
+tube_wall = 0.0005
+
+
+def compatible_motors(thrust_curves: list, diameter: float, wall: float = tube_wall) -> list:
+    """ :param thrust_curves: The motors to choose from.
+    :param diameter: The outer diameter of the body tube (m).
+    :param wall: The wall thickness of the body tube (m).
+    :return: The motors that fit inside the body tube: at most as wide as its inner diameter.
+    """
+    # In mm, like the diameters of the motors. Rounded, so that e.g. an 18 mm motor fits a 19 mm tube.
+    inner_diameter = round((diameter - 2 * wall) * 1000, 6)
+    return [tc for tc in thrust_curves if tc.diameter <= inner_diameter]
+
+
+def recommended_delay(delays: List[str], coast_time: float) -> Optional[float]:
+    """ :param delays: The delays of the motor as in the .eng file. Plugged (P) and empty delays are ignored.
+    :param coast_time: The time between burnout and apogee (s).
+    :return: The available delay that is closest to the coast time, or None if the motor has no delays.
+    """
+    available = []
+    for delay in delays:
+        try:
+            available.append(float(delay))
+        except ValueError:
+            pass
+    if not available:
+        return None
+    return min(available, key=lambda delay: abs(delay - coast_time))
+
+
+def sweep(rocket: Rocket, thrust_curves: list, config: SimConfig = None) -> List[dict]:
+    """ Simulates the rocket with every motor that fits it, all motors in one cached simulate_batch.
+
+    The chute is not deployed, so that every flight reaches its full apogee regardless of the deploy delay of the
+    rocket. Every flight lifts off with the wet mass of its motor on top of the mass of the rocket.
+
+    :param rocket: The rocket.
+    :param thrust_curves: The motors to choose from.
+    :param config: The simulation settings.
+    :return: One row per compatible motor with its file name, name, diameter (mm), apogee (m), max velocity (m/s),
+    max acceleration (g), ideal delay (s) and recommended delay (s, None if the motor has no delays).
+    """
+    thrust_curves = compatible_motors(thrust_curves, rocket.diameter)
+    if not thrust_curves:
+        return []
+    motors = [Motor.from_thrust_curve(tc) for tc in thrust_curves]
+    summary = simulate_batch_cached(motors, rocket.mass, rocket.diameter, rocket.parachute_diameter,
+                                    rocket.parachute_drag_coefficient, np.inf, motor_index=np.arange(len(motors)),
+                                    drag_coefficient=rocket.drag_coefficient, config=config)
+
+    rows = []
+    for i, (tc, motor) in enumerate(zip(thrust_curves, motors)):
+        coast_time = max(summary.t_apogee[i].item() - motor.burnout, 0)
+        rows.append({'file_name': tc.file_name,
+                     'motor': str(tc),
+                     'diameter': tc.diameter,
+                     'apogee': round(summary.apogee[i].item(), 1),
+                     'max_velocity': round(summary.max_velocity[i].item(), 1),
+                     'max_g': round(summary.max_acceleration[i].item() / g, 1),
+                     'ideal_delay': round(coast_time, 1),
+                     'recommended_delay': recommended_delay(tc.delays, coast_time)})
+    return rows
@@ -0,0 +1,83 @@
+import dash_core_components as dcc
+import dash_html_components as html
+import dash_table
+from dash.dependencies import Output, Input, State
+
+import thrust_curve as tc
+from app import app
+from motor_sweep import sweep
+from session_store import session_store
+from simulation import Rocket
+
+pathname = '/motor_sweep'
+page_name = 'Motor sweep'
+
+# The columns of the table: id and name
+columns = [('motor', 'Motor'),
+           ('diameter', 'Diameter (mm)'),
+           ('apogee', 'Apogee (m)'),
+           ('max_velocity', 'Max velocity (m/s)'),
+           ('max_g', 'Max acceleration (g)'),
+           ('ideal_delay', 'Ideal delay (s)'),
+           ('recommended_delay', 'Recommended delay (s)')]
+
+
+def get_layout():
+    return html.Div([
+        html.H3(page_name),
+        html.P('The current rocket with every motor that fits its body tube. Click a column header to sort.'),
+        # The rows are kept in the session store; only the current page is sent to the browser
+        dcc.Loading(
+            id='loading-motor-sweep-table',
+            type='dot',
+            children=dash_table.DataTable(
+                id='motor-sweep-table',
+                columns=[{'id': id, 'name': name} for id, name in columns],
+                sort_action='custom',
+                sort_mode='single',
+                sort_by=[{'column_id': 'apogee', 'direction': 'desc'}],
+                page_action='custom',
+                page_current=0,
+                page_size=25)
+        )
+    ],
+        style={
+            'margin-left': '2rem',
+            'margin-right': '2rem'
+        }
+    )
+
+
+@app.callback(
+    Output('motor-sweep-table', 'data'),
+    Output('motor-sweep-table', 'page_count'),
+    Input('motor-sweep-table', 'page_current'),
+    Input('motor-sweep-table', 'page_size'),
+    Input('motor-sweep-table', 'sort_by'),
+    Input('rocket-builder-data', 'modified_timestamp'),
+    State('session-key', 'data'))
+def motor_sweep_table(page_current, page_size, sort_by, rocket_timestamp, session_id):
+    """ :return: The rows of the current page of the sorted sweep, and the number of pages. """
+    rows = sweep_rows(session_id)
+    if sort_by:
+        column = sort_by[0]['column_id']
+        # Rows without a value (e.g. motors without delays) go last in both directions
+        missing = [row for row in rows if row[column] is None]
+        rows = sorted((row for row in rows if row[column] is not None), key=lambda row: row[column],
+                      reverse=sort_by[0]['direction'] == 'desc') + missing
+    page_current = page_current or 0
+    page_count = max(-(-len(rows) // page_size), 1)
+    return rows[page_current * page_size:(page_current + 1) * page_size], page_count
+
+
+def sweep_rows(session_id: str) -> list:
+    """ :return: The sweep of the rocket of the session. The rows are kept in the session store until the rocket
+    changes.
+    """
+    rocket_data = session_store.get(session_id, 'rocket')
+    stored = session_store.get(session_id, 'motor_sweep')
+    if stored is not None and stored['rocket'] == rocket_data:
+        return stored['rows']
+    rows = sweep(Rocket.from_data(rocket_data), tc.thrust_curves)
+    session_store.set(session_id, 'motor_sweep', {'rocket': rocket_data, 'rows': rows})
+    return rows
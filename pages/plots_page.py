@@ -1,19 +1,63 @@
-import math
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from math import ceil
+from typing import List, Tuple
 
+import dash
+import dash_bootstrap_components as dbc
 import dash_core_components as dcc
 import dash_html_components as html
+import numpy as np
 import plotly.graph_objects as go
-from dash.dependencies import Output, Input
+from dash.dependencies import Output, Input, State
+from dash.exceptions import PreventUpdate
 
+import pages.rocket_builder.rocket_builder_page as rb
 import thrust_curve as tc
 from app import app
-from constants import g
+from downsample import downsample, nearest_indices
+from jobs import DONE, FAILED, FINISHED, JobLimitError, job_manager
+from monte_carlo import chunk_tasks, combine_chunks, percentile_table, relative_dispersions, run_chunk
+from session_store import session_store
+from sim_cache import cache, cache_key, simulate_cached
+from simulation import Motor, Rocket
 
 pathname = '/plots'
 page_name = 'Plots'
 
+# The maximum number of points per trajectory trace sent to the browser
+point_budget = 2000
+# Traces with more points are drawn with WebGL
+webgl_threshold = 1000
 
-def get_layout():
+# The number of bins of the Monte Carlo histograms
+histogram_bins = 50
+# A Monte Carlo run is split into about this many background chunks, of at least min_chunk_size flights, so that its
+# progress and partial results can be shown
+monte_carlo_chunks = 20
+min_chunk_size = 1000
+# The largest Monte Carlo run a request may start, which bounds the memory of the summaries in the workers and here
+max_samples = 1000000
+# How often the page polls a running Monte Carlo job (ms)
+poll_interval = 1000
+
+# The Monte Carlo inputs: name, default value, unit and id
+monte_carlo_inputs = [('samples', 10000, '', 'monte-carlo-samples-input'),
+                      ('seed', 0, '', 'monte-carlo-seed-input'),
+                      ('mass std', 2, '%', 'monte-carlo-mass-input'),
+                      ('drag coefficient std', 10, '%', 'monte-carlo-drag-coefficient-input'),
+                      ('chute drag coefficient std', 10, '%', 'monte-carlo-chute-drag-coefficient-input'),
+                      ('deploy delay std', 0.5, 's', 'monte-carlo-deploy-delay-input'),
+                      ('impulse std', 3, '%', 'monte-carlo-impulse-input')]
+
+
+def get_layout(session_id: str = None):
+    """ :param session_id: The session key. The last Monte Carlo results of the session are shown again, and a
+    running Monte Carlo job is followed again.
+    """
+    result = session_store.get(session_id, 'monte_carlo')
+    job = session_store.get(session_id, 'monte_carlo_job')
+    running = job is not None and job_manager.status(job['job_id'])['status'] not in (None, *FINISHED)
     return html.Div([
         html.H3(page_name),
         dcc.Loading(
@@ -30,7 +74,14 @@ def get_layout():
             id='loading-acceleration-time-graph',
             type='dot',
             children=dcc.Graph(id='acceleration-time-graph')
-        )
+        ),
+        html.H4('Monte Carlo'),
+        *[rb.simple_input(name, value, unit, id=id) for name, value, unit, id in monte_carlo_inputs],
+        html.Button('Run', id='monte-carlo-button'),
+        html.Button('Cancel', id='monte-carlo-cancel-button'),
+        dbc.Progress(id='monte-carlo-progress', value=0, striped=True, animated=True),
+        dcc.Interval(id='monte-carlo-interval', interval=poll_interval, disabled=not running),
+        html.Div(monte_carlo_layout(result) if result is not None else None, id='monte-carlo-results')
     ],
         style={
             'margin-left': '2rem',
@@ -43,193 +94,189 @@ def get_layout():
     Output('altitude-time-graph', 'figure'),
     Output('velocity-time-graph', 'figure'),
     Output('acceleration-time-graph', 'figure'),
-    Input('rocket-builder-data', 'data'),
-    Input('thrust-curve-data', 'data'))
-def graphs(rocket_data, motor_data):
-    dt = 0.01
-    # Load rocket and motor from Store
-    m = 0.1
-    d = 0.05
-    chute_d = 50
-    chute_delay = 5
-    chute_Cd = 1
-    if rocket_data:
-        if 'mass' in rocket_data.keys():
-            m = rocket_data['mass']
-        if 'diameter' in rocket_data.keys():
-            d = rocket_data['diameter']
-        if 'parachute_diameter' in rocket_data.keys():
-            chute_d = rocket_data['parachute_diameter']
-        if 'parachute_deploy_delay' in rocket_data.keys():
-            chute_delay = rocket_data['parachute_deploy_delay']
-        if 'parachute_drag_coefficient' in rocket_data.keys():
-            chute_Cd = rocket_data['parachute_drag_coefficient']
-    motor = tc.thrust_curves[0]
-    if motor_data and 'motor_file' in motor_data.keys():
-        motor = tc.ThrustCurve(motor_data['motor_file'])
-    motor_tc = motor.thrust_curve
-
-    altitude = {}
-    velocity = {}
-    acceleration = {}
-    y = 0
-    v = 0
-    t = 0
-    for t1, F_thrust in motor_tc.items():
-        _, a, v, y = move(0, (t1 - t), F_thrust, v, y, m, d)
-        altitude[t1] = y
-        velocity[t1] = v
-        acceleration[t1] = a
-        t = t1
-    burnout = t
-    while y > 0:
-        if t - burnout < chute_delay:
-            t, a, v, y = move(t, dt, 0, v, y, m, d)
-        else:
-            t, a, v, y = move(t, dt, 0, v, y, m, chute_d, chute_Cd)
-        altitude[t] = y
-        velocity[t] = v
-        acceleration[t] = a
-
-    apogee = max(altitude.values())
-    t_apogee = list(altitude.keys())[list(altitude.values()).index(apogee)]
-
-    x_range = [-0.025 * max(altitude.keys()), 1.025 * max(altitude.keys())]
-
-    # ------------------------------ Altitude ------------------------------
-    alt_range = [min(altitude.values()) - 0.05 * (max(altitude.values()) - min(altitude.values())),
-                 max(altitude.values()) + 0.05 * (max(altitude.values()) - min(altitude.values()))]
-    # Altitude
-    fig_alt = go.Figure(go.Scatter(x=list(altitude.keys()),
-                                   y=list(altitude.values()),
-                                   mode='lines',
-                                   hovertemplate='<b>%{text}</b>',
-                                   text=[f't = {round(time, 3)} s<br>'
-                                         f'y = {round(alt, 3)} m'
-                                         for time, alt in altitude.items()],
-                                   name='Altitude'))
-    # Motor burnout
-    fig_alt.add_trace(go.Scatter(x=[burnout, burnout],
-                                 y=alt_range,
-                                 mode='lines',
-                                 name='Burnout'))
-    # Chute deploy
-    fig_alt.add_trace(go.Scatter(x=[burnout + chute_delay, burnout + chute_delay],
-                                 y=alt_range,
-                                 mode='lines',
-                                 name='Chute deploy'))
-    # Apogee
-    fig_alt.add_trace(go.Scatter(x=[t_apogee, t_apogee],
-                                 y=alt_range,
-                                 mode='lines',
-                                 name='Apogee'))
-    # Set axis ranges
-    fig_alt.update_xaxes(range=x_range)
-    fig_alt.update_yaxes(range=alt_range)
-    # Set titles
-    fig_alt.update_layout(title_text='Altitude-time',
-                          xaxis_title_text='Time (s)',
-                          yaxis_title_text='Altitude (m)')
-
-    # ------------------------------ Velocity ------------------------------
-    vel_range = [min(velocity.values()) - 0.05 * (max(velocity.values()) - min(velocity.values())),
-                 max(velocity.values()) + 0.05 * (max(velocity.values()) - min(velocity.values()))]
-    # Velocity
-    fig_vel = go.Figure(go.Scatter(x=list(velocity.keys()),
-                                   y=list(velocity.values()),
-                                   mode='lines',
-                                   hovertemplate='<b>%{text}</b>',
-                                   text=[f't = {round(time, 3)} s<br>'
-                                         f'v = {round(vel, 3)} m/s'
-                                         for time, vel in velocity.items()],
-                                   name='Velocity'))
-    # Motor burnout
-    fig_vel.add_trace(go.Scatter(x=[burnout, burnout],
-                                 y=vel_range,
-                                 mode='lines',
-                                 name='Burnout'))
-    # Chute deploy
-    fig_vel.add_trace(go.Scatter(x=[burnout + chute_delay, burnout + chute_delay],
-                                 y=vel_range,
-                                 mode='lines',
-                                 name='Chute deploy'))
-    # Apogee
-    fig_vel.add_trace(go.Scatter(x=[t_apogee, t_apogee],
-                                 y=vel_range,
-                                 mode='lines',
-                                 name='Apogee'))
-    # Set axis ranges
-    fig_vel.update_xaxes(range=x_range)
-    fig_vel.update_yaxes(range=vel_range)
-    # Set titles
-    fig_vel.update_layout(title_text='Velocity-time',
+    Input('rocket-builder-data', 'modified_timestamp'),
+    Input('thrust-curve-data', 'modified_timestamp'),
+    Input('session-key', 'data'))
+def graphs(rocket_timestamp, motor_timestamp, session_id):
+    rocket, motor = load_rocket_and_motor(session_id)
+    try:
+        trajectory = simulate_cached(rocket, motor)
+    except ValueError as e:
+        # E.g. a rocket without mass
+        return tuple(go.Figure(layout_title_text=str(e)) for _ in range(3))
+    burnout = trajectory.events['burnout']
+    chute_deploy = burnout + rocket.parachute_deploy_delay
+    t_apogee = trajectory.events['apogee']
+    events = [(burnout, 'Burnout'), (chute_deploy, 'Chute deploy'), (t_apogee, 'Apogee')]
+
+    time = trajectory.t
+    x_range = [-0.025 * time.max(), 1.025 * time.max()]
+    # The hover of every figure shows all three quantities
+    customdata = np.column_stack([trajectory.y, trajectory.v, trajectory.a])
+    hovertemplate = '<b>t = %{x:.3f} s<br>' \
+                    'y = %{customdata[0]:.3f} m<br>' \
+                    'v = %{customdata[1]:.3f} m/s<br>' \
+                    'a = %{customdata[2]:.3f} m/s^2</b>'
+    figures = []
+    for values, name, yaxis_title_text in (
+            (trajectory.y, 'Altitude', 'Altitude (m)'),
+            (trajectory.v, 'Velocity', r'$\textsf{Velocity }(\frac{\textsf{m}}{\textsf{s}})$'),
+            (trajectory.a, 'Acceleration', r'$\textsf{Acceleration }(\frac{\textsf{m}}{\textsf{s}^2})$')):
+        fig = trajectory_figure(time, values, customdata, hovertemplate, name, events)
+        fig.update_xaxes(range=x_range)
+        fig.update_layout(title_text=f'{name}-time',
                           xaxis_title_text='Time (s)',
-                          yaxis_title_text=r'$\textsf{Velocity }(\frac{\textsf{m}}{\textsf{s}})$')
-
-    # ------------------------------ Acceleration ------------------------------
-    acc_range = [min(acceleration.values()) - 0.05 * (max(acceleration.values()) - min(acceleration.values())),
-                 max(acceleration.values()) + 0.05 * (max(acceleration.values()) - min(acceleration.values()))]
-    # Acceleration
-    fig_acc = go.Figure(go.Scatter(x=list(acceleration.keys()),
-                                   y=list(acceleration.values()),
-                                   mode='lines',
-                                   hovertemplate='<b>%{text}</b>',
-                                   text=[f't = {round(time, 3)} s<br>'
-                                         f'a = {round(acc, 3)} m/s^2'
-                                         for time, acc in acceleration.items()],
-                                   name='Acceleration'))
-    # Motor burnout
-    fig_acc.add_trace(go.Scatter(x=[burnout, burnout],
-                                 y=acc_range,
-                                 mode='lines',
-                                 name='Burnout'))
-    # Chute deploy
-    fig_acc.add_trace(go.Scatter(x=[burnout + chute_delay, burnout + chute_delay],
-                                 y=acc_range,
-                                 mode='lines',
-                                 name='Chute deploy'))
-    # Apogee
-    fig_acc.add_trace(go.Scatter(x=[t_apogee, t_apogee],
-                                 y=acc_range,
+                          yaxis_title_text=yaxis_title_text)
+        figures.append(fig)
+    return tuple(figures)
+
+
+def trajectory_figure(time: np.ndarray, values: np.ndarray, customdata: np.ndarray, hovertemplate: str, name: str,
+                      events: List[Tuple[float, str]], budget: int = None) -> go.Figure:
+    """ Plots one quantity of the flight against time, with a vertical line at every event.
+
+    Long flights are downsampled to the point budget with LTTB; the points closest to the events and the extremes of
+    the quantity are always kept. Above webgl_threshold points the figure uses WebGL.
+
+    :param time: The times of the samples.
+    :param values: The quantity at every sample.
+    :param customdata: The numeric hover data of every sample.
+    :param hovertemplate: The hover template, referencing customdata.
+    :param name: The name of the quantity.
+    :param events: The time and name of every event.
+    :param budget: The maximum number of points to plot. Default: point_budget.
+    :return: The figure.
+    """
+    budget = budget or point_budget
+    keep = np.concatenate([nearest_indices(time, [t for t, _ in events]), [np.argmax(values), np.argmin(values)]])
+    rows = downsample(time, values, budget, keep)
+    scatter = go.Scattergl if len(rows) > webgl_threshold else go.Scatter
+
+    low, high = values.min(), values.max()
+    value_range = [low - 0.05 * (high - low), high + 0.05 * (high - low)]
+    # Rounded to well below what the hover shows, which keeps the JSON numbers short
+    fig = go.Figure(scatter(x=time[rows].round(4),
+                            y=values[rows].round(4),
+                            customdata=customdata[rows].round(4),
+                            mode='lines',
+                            hovertemplate=hovertemplate,
+                            name=name))
+    for t, event_name in events:
+        fig.add_trace(go.Scatter(x=[t, t],
+                                 y=value_range,
                                  mode='lines',
-                                 name='Apogee'))
-    # Set axis ranges
-    fig_acc.update_xaxes(range=x_range)
-    fig_acc.update_yaxes(range=acc_range)
-    # Set titles
-    fig_acc.update_layout(title_text='Acceleration-time',
-                          xaxis_title_text='Time (s)',
-                          yaxis_title_text=r'$\textsf{Acceleration }(\frac{\textsf{m}}{\textsf{s}^2})$')
+                                 name=event_name))
+    fig.update_yaxes(range=value_range)
+    return fig
 
-    return fig_alt, fig_vel, fig_acc
 
+@app.callback(
+    Output('monte-carlo-results', 'children'),
+    Output('monte-carlo-progress', 'value'),
+    Output('monte-carlo-interval', 'disabled'),
+    Input('monte-carlo-button', 'n_clicks'),
+    Input('monte-carlo-cancel-button', 'n_clicks'),
+    Input('monte-carlo-interval', 'n_intervals'),
+    [State(id, 'value') for _, _, _, id in monte_carlo_inputs],
+    State('session-key', 'data'))
+def monte_carlo_results(run_clicks, cancel_clicks, n_intervals, samples, seed, mass_std, drag_coefficient_std,
+                        chute_drag_coefficient_std, deploy_delay_std, impulse_std, session_id):
+    """ Runs a Monte Carlo analysis of the current rocket and motor with normally distributed parameters as a
+    background job, and follows its progress. The result is kept in the session store.
 
-def move(t: float, dt: float, F_thrust: float, v: float, y: float, m: float, d: float, Cd: float = None) \
-        -> tuple[float, float, float, float]:
-    if not Cd:
-        F = F_thrust - g * m + calc_drag_force(v, d)
-    else:
-        F = F_thrust - g * m + calc_drag_force(v, d, Cd)
-    a = F / m
-    v += a * dt
-    y += v * dt
-    if y < 0:
-        y = 0
-        v = 0
-    return t + dt, a, v, y
+    :return: The results so far, the progress (%) and whether polling stops.
+    """
+    changed_id = [p['prop_id'] for p in dash.callback_context.triggered][0]
+    job = session_store.get(session_id, 'monte_carlo_job')
+    if 'monte-carlo-button' in changed_id and run_clicks:
+        rocket, motor = load_rocket_and_motor(session_id)
+        dispersions = relative_dispersions(rocket,
+                                           mass=mass_std or 0,
+                                           drag_coefficient=drag_coefficient_std or 0,
+                                           parachute_drag_coefficient=chute_drag_coefficient_std or 0,
+                                           parachute_deploy_delay=deploy_delay_std or 0,
+                                           impulse_scale=impulse_std or 0)
+        samples, seed = int(samples or 0), int(seed or 0)
+        if samples > max_samples:
+            return html.P(f'At most {max_samples} samples, please'), 0, True
+        chunk_size = max(ceil(samples / monte_carlo_chunks), min_chunk_size)
+        key = cache_key('monte_carlo', rocket, motor, dispersions, samples=samples, seed=seed, chunk_size=chunk_size)
+        result = cache.get(key)
+        if result is not None:
+            session_store.set(session_id, 'monte_carlo', result)
+            return monte_carlo_layout(result), 100, True
+        if job is not None:
+            job_manager.cancel(job['job_id'])
+        tasks = chunk_tasks(rocket, motor, dispersions, samples, seed, chunk_size)
+        try:
+            job_id = job_manager.submit(session_id, 'monte_carlo', [(run_chunk, (task,)) for task in tasks],
+                                        partial(combine_chunks, names=list(dispersions), seed=seed))
+        except JobLimitError as e:
+            return html.P(str(e)), 0, True
+        except BrokenProcessPool:
+            return html.P('The simulation workers stopped unexpectedly. Please try again.'), 0, True
+        session_store.set(session_id, 'monte_carlo_job', {'job_id': job_id, 'key': key})
+        return html.P(f'Simulating {samples} flights...'), 0, False
 
+    if job is None:
+        raise PreventUpdate
+    if 'monte-carlo-cancel-button' in changed_id:
+        if not cancel_clicks:
+            raise PreventUpdate
+        job_manager.cancel(job['job_id'])
 
-def calc_drag_force(v: float, d: float, Cd=0.5):
-    """ F_drag = 0.5 * Cd * ρ * v^2 * A
+    status = job_manager.status(job['job_id'])
+    progress = round(100 * status['progress'])
+    if status['status'] is None:
+        return html.P('The Monte Carlo job has expired'), 0, True
+    if status['status'] == FAILED:
+        return html.P(f'The Monte Carlo job failed: {status["error"]}'), progress, True
+    if status['status'] == DONE:
+        result = job_manager.result(job['job_id'])
+        cache.put(job['key'], result)
+        session_store.set(session_id, 'monte_carlo', result)
+        return monte_carlo_layout(result), 100, True
+    result = job_manager.partial_result(job['job_id'])
+    stopped = status['status'] in FINISHED
+    note = html.P(f'{"Cancelled" if stopped else "Running"}: {len(result) if result else 0} flights')
+    return [note, *(monte_carlo_layout(result) if result is not None else [])], progress, stopped
 
-    https://www.grc.nasa.gov/www/k-12/airplane/drageq.html
 
-    :param v: Velocity
-    :param d: Diameter
-    :param Cd: Drag coefficient
-    :return: The drag force
+def monte_carlo_layout(result) -> list:
+    """ :param result: A monte_carlo.MonteCarloResult.
+    :return: A table with the percentiles of the results and histograms of the apogee and the landing speed.
     """
-    direction = 1
-    if v > 0:
-        direction = -1
-    return direction * 0.5 * Cd * 1.205 * (v ** 2) * ((d / 2) ** 2 * math.pi)
+    if not len(result):
+        return [html.P('No samples')]
+
+    rows = percentile_table(result)
+    columns = list(rows[0].keys())
+    table = dbc.Table([html.Thead(html.Tr([html.Th(column) for column in columns])),
+                       html.Tbody([html.Tr([html.Td(row.get(column)) for column in columns]) for row in rows])],
+                      bordered=True,
+                      size='sm')
+
+    figures = []
+    for name, title, unit in (('apogee', 'Apogee', 'm'), ('landing_speed', 'Landing speed', 'm/s')):
+        # Binned here, so the page gets histogram_bins bars instead of every sample
+        values = getattr(result.summary, name)
+        counts, edges = np.histogram(values[np.isfinite(values)], bins=histogram_bins)
+        fig = go.Figure(go.Bar(x=((edges[:-1] + edges[1:]) / 2).round(4),
+                               y=counts,
+                               width=np.diff(edges).round(4),
+                               name=title))
+        fig.update_layout(title_text=f'{title} distribution',
+                          xaxis_title_text=f'{title} ({unit})',
+                          yaxis_title_text='Flights')
+        figures.append(dcc.Graph(figure=fig))
+    return [table, *figures]
+
+
+def load_rocket_and_motor(session_id: str):
+    """ :return: The rocket and motor of the session. """
+    rocket = Rocket.from_data(session_store.get(session_id, 'rocket'))
+    motor_data = session_store.get(session_id, 'motor')
+    motor_file = tc.get_default_motor_file()
+    if motor_data and 'motor_file' in motor_data.keys():
+        motor_file = motor_data['motor_file']
+    return rocket, Motor.from_thrust_curve(tc.get_thrust_curve(motor_file))
@@ -3,20 +3,18 @@ from dash.dependencies import Output, Input
 
 import pages.rocket_builder.rocket_builder_page as rb
 from app import app
-from conversions import metric_convert
+from conversions import InputConversions
 
 inputs = {
     'nose cone length': {'unit': 'cm', 'default_value': 10.5, 'input_prefix': 'c', 'si_prefix': '-'}
 }
+conversions = InputConversions(inputs)
 
 
 def get_layout(data):
+    values = conversions.from_si(data)
     layout = [html.H3('Nose cone')]
-    layout.extend([rb.simple_input(i,
-                                   metric_convert(data[i.replace(' ', '_')],
-                                                  inputs[i]['si_prefix'],
-                                                  inputs[i]['input_prefix']),
-                                   inputs[i]['unit'])
+    layout.extend([rb.simple_input(i, values[i], inputs[i]['unit'])
                    for i in inputs])
     return layout
 
@@ -26,15 +24,8 @@ def get_layout(data):
     Input('nose-cone-length-input', 'value')
 )
 def save_data(nose_cone_length: float):
-    return {
-        'nose_cone_length': round(
-            metric_convert(nose_cone_length,
-                           inputs['nose cone length']['input_prefix'],
-                           inputs['nose cone length']['si_prefix']),
-            4)
-    }
+    return conversions.to_si([nose_cone_length], ndigits=4)
 
 
 def init_data(data):
-    if 'nose_cone_length' not in data.keys():
-        data['nose_cone_length'] = rb.convert_default_input('nose cone length', inputs)
+    conversions.init_data(data)
@@ -2,18 +2,21 @@ import dash
 import dash_core_components as dcc
 import dash_daq as daq
 import dash_html_components as html
-import plotly.graph_objects as go
-from dash.dependencies import Output, Input, State
+from dash.dependencies import ClientsideFunction, Output, Input, State
 from dash.exceptions import PreventUpdate
 
 from app import app
-from conversions import metric_convert
 from pages import page404
 from pages.rocket_builder import fins_page, nose_cone_page, body_tube_page, recovery_page
+from session_store import session_store
 
 pathname = '/rocket_builder'
 page_name = 'Rocket builder'
 cur_page = ''  # main, fins, body tube, nose cone
+# The keys of the rocket that the rocket drawing needs (assets/rocket_drawing.js). Only these are sent to the browser,
+# the whole rocket is kept in the session store.
+drawing_keys = ('nose_cone_length', 'body_tube_length', 'diameter', 'root_chord', 'tip_chord', 'fin_height',
+                'sweep_length', 'number_of_fins')
 
 
 @app.callback(
@@ -76,6 +79,7 @@ def get_layout(data, url):
     layout.append(dcc.Graph(id='rocket-drawing'))
 
     layout.extend([
+        dcc.Store(id='rocket-builder-defaults', data=drawing_data(default_data())),
         dcc.Store(id='fin-builder-data'),
         dcc.Store(id='body-tube-builder-data'),
         dcc.Store(id='nose-cone-builder-data'),
@@ -142,59 +146,14 @@ def html_unit(unit: str):
                          'display': 'inline-block'})
 
 
-@app.callback(
+# Drawn in the browser by assets/rocket_drawing.js, so editing the rocket needs no server round trip
+app.clientside_callback(
+    ClientsideFunction(namespace='rocket_builder', function_name='draw_rocket'),
     Output('rocket-drawing', 'figure'),
     Input('rocket-builder-data', 'modified_timestamp'),
-    State('rocket-builder-data', 'data')
+    State('rocket-builder-data', 'data'),
+    State('rocket-builder-defaults', 'data')
 )
-def draw_rocket(ts, data):
-    data = data or {}
-    init_data(data)
-
-    nose_length = data['nose_cone_length']
-    tube_length = data['body_tube_length']
-    diameter = data['diameter']
-    root_chord = data['root_chord']
-    sweep_length = data['sweep_length']
-    tip_chord = data['tip_chord']
-    fin_height = data['fin_height']
-
-    length = nose_length + tube_length
-    radius = diameter / 2
-    nose_cone = {'x': [0, nose_length, nose_length, 0],
-                 'y': [0, radius, -radius, 0]}
-    body = {'x': [nose_length, nose_length, length, length, nose_length],
-            'y': [radius, -radius, -radius, radius, radius]}
-    fin = {'x': [length, length - root_chord, length - root_chord + sweep_length,
-                 length - root_chord + sweep_length + tip_chord, length],
-           'y': [radius, radius, radius + fin_height, radius + fin_height, radius]}
-
-    x = []
-    x.extend([i for i in nose_cone['x']])
-    x.append(None)
-    x.extend([i for i in body['x']])
-    x.append(None)
-    x.extend([i for i in fin['x']])
-    x.append(None)
-    x.extend([i for i in fin['x']])
-    y = []
-    y.extend([i for i in nose_cone['y']])
-    y.append(None)
-    y.extend([i for i in body['y']])
-    y.append(None)
-    y.extend([i for i in fin['y']])
-    y.append(None)
-    y.extend([-i for i in fin['y']])
-
-    fig = go.Figure(
-        go.Scatter(x=x,
-                   y=y,
-                   fill='toself'))
-    fig.update_layout(plot_bgcolor='white')
-    fig.update_xaxes(visible=False)
-    fig.update_yaxes(visible=False, scaleanchor='x', scaleratio=1)
-
-    return fig
 
 
 @app.callback(
@@ -203,34 +162,39 @@ def draw_rocket(ts, data):
     Input('body-tube-builder-data', 'data'),
     Input('fin-builder-data', 'data'),
     Input('recovery-builder-data', 'data'),
-    State('rocket-builder-data', 'data')
+    Input('session-key', 'data')
 )
-def save_data(nose_cone, body_tube, fins, recovery, data):
-    data = data or {}
+def save_data(nose_cone, body_tube, fins, recovery, session_id):
+    """ Merges the data of the builder pages into the rocket of the session in the session store. Waits for the
+    session key of a new session, and runs again once it is there.
+
+    :return: The dimensions of the merged rocket, for the rocket drawing.
+    """
+    if not session_id:
+        raise PreventUpdate
+    data = session_store.get(session_id, 'rocket') or {}
+    init_data(data)
+    for page_data in (nose_cone, body_tube, fins, recovery):
+        if page_data is not None:
+            data.update(page_data)
+    session_store.set(session_id, 'rocket', data)
+    return drawing_data(data)
+
+
+def default_data() -> dict:
+    """ :return: The rocket-builder-data of a rocket with only default values. """
+    data = {}
     init_data(data)
-    if nose_cone is not None:
-        for key, val in nose_cone.items():
-            data[key] = val
-    if body_tube is not None:
-        for key, val in body_tube.items():
-            data[key] = val
-    if fins is not None:
-        for key, val in fins.items():
-            data[key] = val
-    if recovery is not None:
-        for key, val in recovery.items():
-            data[key] = val
     return data
 
 
+def drawing_data(data: dict) -> dict:
+    """ :return: The part of the rocket-builder-data that the rocket drawing needs, see drawing_keys. """
+    return {key: data[key] for key in drawing_keys if key in data}
+
+
 def init_data(data):
     nose_cone_page.init_data(data)
     body_tube_page.init_data(data)
     fins_page.init_data(data)
     recovery_page.init_data(data)
-
-
-def convert_default_input(name: str, inputs: dict[str, dict]) -> float:
-    return metric_convert(inputs[name]['default_value'],
-                          inputs[name]['input_prefix'],
-                          inputs[name]['si_prefix'])
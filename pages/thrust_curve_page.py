@@ -1,50 +1,86 @@
+import threading
 from math import ceil, floor, log2
 
 import dash_core_components as dcc
 import dash_html_components as html
 import plotly.graph_objects as go
+import dash
 from dash.dependencies import Input, Output
+from dash.exceptions import PreventUpdate
 
 from app import app
-from thrust_curve import thrust_curves, ThrustCurve
+from motor_index import MotorIndex
+from session_store import session_store
+from thrust_curve import get_default_motor_file, get_thrust_curve, get_thrust_curves
 
 pathname = '/thrust_curves'
 page_name = 'Thrust curves'
 
-# The option for the dropdown. List of pairs of motor names and file names.
-motor_options = [{'label': str(tc), 'value': tc.file_name} for tc in thrust_curves]
-# The manufacturers to show in the selector dropdown.
-manufacturers = sorted(set([tc.manufacturer for tc in thrust_curves]))
-manufacturer_options = [{'label': '<all>', 'value': '<all>'}]
-manufacturer_options.extend([{'label': m, 'value': m} for m in manufacturers])
-# All unique diameters
-diameters = sorted({tc.diameter for tc in thrust_curves})
-# Min and max length
-lengths = {tc.length for tc in thrust_curves}
-lengths = [min(lengths), max(lengths)]
-# Min and max impulse
-impulses = {tc.impulse for tc in thrust_curves}
-impulses = [min(impulses), max(impulses)]
-# Min and max avg_thrust
-avg_thrusts = {tc.avg_thrust for tc in thrust_curves}
-avg_thrusts = [min(avg_thrusts), max(avg_thrusts)]
-# Min and max burn_time
-burn_times = {tc.burn_time for tc in thrust_curves}
-burn_times = [min(burn_times), max(burn_times)]
+
+class CatalogView:
+    def __init__(self, thrust_curves: list):
+        """ The index of the motors and the dropdown options and slider ranges derived from it.
+
+        :param thrust_curves: All motors.
+        """
+        # Columnar index of all motors, used to filter the dropdown.
+        self.motor_index = MotorIndex(thrust_curves)
+        # The option for the dropdown. List of pairs of motor names and file names.
+        self.motor_options = self.motor_index.options
+        # The manufacturers to show in the selector dropdown.
+        self.manufacturers = self.motor_index.manufacturers
+        self.manufacturer_options = [{'label': '<all>', 'value': '<all>'}]
+        self.manufacturer_options.extend([{'label': m, 'value': m} for m in self.manufacturers])
+        # All unique diameters
+        self.diameters = self.motor_index.unique('diameter')
+        # Min and max length
+        self.lengths = self.motor_index.value_range('length')
+        # Min and max impulse
+        self.impulses = self.motor_index.value_range('impulse')
+        # Min and max avg_thrust
+        self.avg_thrusts = self.motor_index.value_range('avg_thrust')
+        # Min and max burn_time
+        self.burn_times = self.motor_index.value_range('burn_time')
+        self.default_motor = get_default_motor_file()
+
+
+_catalog_view = None
+_catalog_view_lock = threading.Lock()
+
+
+def catalog_view() -> CatalogView:
+    """ :return: The view of all motors. It is built the first time it is needed, not when the page is imported. """
+    global _catalog_view
+    if _catalog_view is None:
+        with _catalog_view_lock:
+            if _catalog_view is None:
+                _catalog_view = CatalogView(get_thrust_curves())
+    return _catalog_view
+
+
+def reload_catalog_view():
+    """ Replaces the view with one of the current motors, after they were reloaded. The old view keeps serving until
+    the new one is complete. A view that hasn't been built yet is left to catalog_view.
+    """
+    global _catalog_view
+    with _catalog_view_lock:
+        if _catalog_view is not None:
+            _catalog_view = CatalogView(get_thrust_curves())
 
 
 def get_layout(data):
+    view = catalog_view()
     # Load the current motor from Store
     if data:
         cur_motor = data['motor_file']
     else:
-        cur_motor = thrust_curves[0].file_name
+        cur_motor = view.default_motor
 
     return html.Div([
         html.H3(page_name),
         dcc.Dropdown(
             id='thrust-curve-dropdown',
-            options=motor_options,
+            options=view.motor_options,
             value=cur_motor),
         # Filter by:
         # manufacturer
@@ -54,7 +90,7 @@ def get_layout(data):
             html.Div(
                 dcc.Dropdown(
                     id='manufacturer-dropdown',
-                    options=manufacturer_options,
+                    options=view.manufacturer_options,
                     value='<all>'),
                 style={'display': 'inline-block', 'width': '90%'}
             )
@@ -67,22 +103,22 @@ def get_layout(data):
                 dcc.RangeSlider(
                     id='diameter-slider',
                     min=0,
-                    max=len(diameters) - 1,
+                    max=len(view.diameters) - 1,
                     step=None,
-                    marks=dict([(i, str(d)) for i, d in enumerate(diameters)]),
-                    value=[0, len(diameters) - 1]),
+                    marks=dict([(i, str(d)) for i, d in enumerate(view.diameters)]),
+                    value=[0, len(view.diameters) - 1]),
                 style={'display': 'inline-block', 'width': '90%'})
         ]),
         # length
-        log_range_slider('length', 'mm', lengths),
+        log_range_slider('length', 'mm', view.lengths),
         # impulse
-        log_range_slider('impulse', 'Ns', impulses),
+        log_range_slider('impulse', 'Ns', view.impulses),
         # avg_thrust
-        log_range_slider('thrust', 'N', avg_thrusts),
+        log_range_slider('thrust', 'N', view.avg_thrusts),
         # burn_time
-        log_range_slider('burn time', 's', burn_times),
+        log_range_slider('burn time', 's', view.burn_times),
         # impulse_range - Not implemented yet
-        # continuous_range_slider('burn time', burn_times),
+        # continuous_range_slider('burn time', view.burn_times),
         dcc.Graph(id='thrust-curve'),
     ],
         style={
@@ -178,13 +214,17 @@ def apply_filters(manufacturer: str, diameter_vals: list, length_vals: list, imp
     thrust_vals = [do_exp(t) for t in thrust_vals]
     burn_time_vals = [do_exp(b) for b in burn_time_vals]
 
-    curves = [tc for tc in thrust_curves if manufacturer == '<all>' or tc.manufacturer == manufacturer]
-    curves = [tc for tc in curves if diameters[diameter_vals[0]] <= tc.diameter <= diameters[diameter_vals[-1]]]
-    curves = [tc for tc in curves if length_vals[0] <= tc.length <= length_vals[-1]]
-    curves = [tc for tc in curves if impulse_vals[0] <= tc.impulse <= impulse_vals[-1]]
-    curves = [tc for tc in curves if thrust_vals[0] <= tc.avg_thrust <= thrust_vals[-1]]
-    curves = [tc for tc in curves if burn_time_vals[0] <= tc.burn_time <= burn_time_vals[-1]]
-    return [{'label': str(tc), 'value': tc.file_name} for tc in curves], \
+    view = catalog_view()
+    diameters = view.diameters
+    # The slider may still have the positions of the diameters before the motors were reloaded
+    diameter_vals = [min(i, len(diameters) - 1) for i in diameter_vals]
+    options = view.motor_index.query_options(manufacturer=None if manufacturer == '<all>' else manufacturer,
+                                             diameter=(diameters[diameter_vals[0]], diameters[diameter_vals[-1]]),
+                                             length=(length_vals[0], length_vals[-1]),
+                                             impulse=(impulse_vals[0], impulse_vals[-1]),
+                                             avg_thrust=(thrust_vals[0], thrust_vals[-1]),
+                                             burn_time=(burn_time_vals[0], burn_time_vals[-1]))
+    return options, \
            round(length_vals[0]), round(length_vals[-1]), \
            round(impulse_vals[0], 3), round(impulse_vals[-1], 3), \
            round(thrust_vals[0], 3), round(thrust_vals[-1], 3), \
@@ -194,19 +234,29 @@ def apply_filters(manufacturer: str, diameter_vals: list, length_vals: list, imp
 @app.callback(
     Output('thrust-curve', 'figure'),
     Output('thrust-curve-data', 'data'),
-    Input('thrust-curve-dropdown', 'value')
+    Input('thrust-curve-dropdown', 'value'),
+    Input('session-key', 'data')
 )
-def plot_thrust_curve(file_name: str):
+def plot_thrust_curve(file_name: str, session_id: str):
+    """ Plots the motor and makes it the motor of the session. Waits for the session key of a new session, and runs
+    again once it is there.
+
+    :return: The figure, and the file name of the motor as the change token of thrust-curve-data. The motor itself is
+    kept in the session store.
+    """
+    if not session_id:
+        raise PreventUpdate
     if file_name is None:
-        return go.Figure()
-    thrust_curve = ThrustCurve(file_name)
+        return go.Figure(), dash.no_update
+    thrust_curve = get_thrust_curve(file_name)
+    session_store.set(session_id, 'motor', save_data(file_name))
     return (thrust_curve.plot(),
-            save_data(file_name))
+            file_name)
 
 
 def save_data(file_name: str):
     current_motor = ''
-    for m in motor_options:
+    for m in catalog_view().motor_options:
         if m['value'] == file_name:
             current_motor = m['label']
     data = {'motor_name': current_motor, 'motor_file': file_name}
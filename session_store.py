@@ -0,0 +1,135 @@
+""" Server-side session state.
+
+The browser only keeps a small session key in the session-key store. Everything else a session needs (the rocket, the
+motor, simulation results) is kept here, in a SQLite database shared by all worker processes of the app.
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Optional
+
+
+def new_session_id() -> str:
+    return uuid.uuid4().hex
+
+
+# A session that is read is marked as used again once it hasn't been for this fraction of its ttl
+touch_fraction = 0.01
+
+
+class SessionStore:
+    def __init__(self, path: str, ttl: float = 7 * 24 * 3600, max_bytes: int = 512 * 2 ** 20, evict_every: int = 100,
+                 touch_after: float = None):
+        """ Values by session and name in a SQLite database.
+
+        :param path: The database file. ':memory:' keeps the store in memory, separately for every thread.
+        :param ttl: Sessions that haven't been used for this long (s) are deleted.
+        :param max_bytes: When the values take more than this, the least recently used sessions are deleted.
+        :param evict_every: Run the eviction after every this many writes.
+        :param touch_after: A read marks the session as used only if it hasn't been for this long (s), so that most
+            reads don't write. Defaults to a fraction of the ttl, see touch_fraction.
+        """
+        self.path = path
+        self.ttl = ttl
+        self.touch_after = ttl * touch_fraction if touch_after is None else touch_after
+        self.max_bytes = max_bytes
+        self.evict_every = evict_every
+        self._writes = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        """ :return: The connection of this thread. SQLite connections can't be shared between threads. """
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            if self.path != ':memory:':
+                os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('CREATE TABLE IF NOT EXISTS session_values ('
+                               'session_id TEXT NOT NULL, '
+                               'name TEXT NOT NULL, '
+                               'value BLOB NOT NULL, '
+                               'size INTEGER NOT NULL, '
+                               'accessed REAL NOT NULL, '
+                               'PRIMARY KEY (session_id, name))')
+            connection.execute('CREATE INDEX IF NOT EXISTS session_values_accessed ON session_values (accessed)')
+            self._local.connection = connection
+        return connection
+
+    def get(self, session_id: Optional[str], name: str, default=None) -> Any:
+        """ :return: The value of the session by name, or the default if the session or the name doesn't exist. """
+        if not session_id:
+            return default
+        connection = self._connection()
+        row = connection.execute('SELECT value, accessed FROM session_values WHERE session_id = ? AND name = ?',
+                                 (session_id, name)).fetchone()
+        if row is None:
+            return default
+        now = time.time()
+        if row[1] < now - self.touch_after:
+            connection.execute('UPDATE session_values SET accessed = ? WHERE session_id = ? AND accessed < ?',
+                               (now, session_id, now - self.touch_after))
+        return pickle.loads(row[0])
+
+    def set(self, session_id: Optional[str], name: str, value: Any):
+        """ Stores the value of the session by name. Does nothing without a session id. """
+        if not session_id:
+            return
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        connection = self._connection()
+        connection.execute('INSERT OR REPLACE INTO session_values VALUES (?, ?, ?, ?, ?)',
+                           (session_id, name, blob, len(blob), time.time()))
+        with self._lock:
+            self._writes += 1
+            evict = self._writes % self.evict_every == 0
+        if evict:
+            self.evict()
+
+    def update(self, session_id: Optional[str], name: str, values: dict) -> dict:
+        """ Merges the values into the dict of the session by name.
+
+        :return: The merged dict.
+        """
+        data = self.get(session_id, name) or {}
+        data.update(values)
+        self.set(session_id, name, data)
+        return data
+
+    def delete(self, session_id: str, name: str = None):
+        """ Deletes a value of the session, or the whole session if no name is given. """
+        if name is None:
+            self._connection().execute('DELETE FROM session_values WHERE session_id = ?', (session_id,))
+        else:
+            self._connection().execute('DELETE FROM session_values WHERE session_id = ? AND name = ?',
+                                       (session_id, name))
+
+    def evict(self):
+        """ Deletes the expired sessions, then the least recently used sessions until the values fit in max_bytes. """
+        connection = self._connection()
+        connection.execute('DELETE FROM session_values WHERE session_id IN '
+                           '(SELECT session_id FROM session_values GROUP BY session_id HAVING MAX(accessed) < ?)',
+                           (time.time() - self.ttl,))
+        total = connection.execute('SELECT COALESCE(SUM(size), 0) FROM session_values').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        sessions = connection.execute('SELECT session_id, SUM(size) FROM session_values GROUP BY session_id '
+                                      'ORDER BY MAX(accessed)').fetchall()
+        for session_id, size in sessions:
+            if total <= self.max_bytes:
+                break
+            self.delete(session_id)
+            total -= size
+
+    def stats(self) -> dict:
+        """ :return: The number of sessions, the number of values and their total size in bytes. """
+        sessions, values, size = self._connection().execute(
+            'SELECT COUNT(DISTINCT session_id), COUNT(*), COALESCE(SUM(size), 0) FROM session_values').fetchone()
+        return {'sessions': sessions, 'values': values, 'bytes': size}
+
+
+# The session store of the app
+session_store = SessionStore(os.path.join('cache', 'sessions.sqlite3'))
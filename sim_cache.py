@@ -0,0 +1,222 @@
+""" A content-addressed cache of simulation results.
+
+Results are keyed by a SHA-256 hash of a canonical JSON form of everything they depend on: the rocket, the content hash
+of the thrust curve of every motor, the simulation settings and simulation.SIM_VERSION. Equal inputs give the same key
+in every process, so the on-disk tier is shared between the app, scripts and batch tooling.
+
+The cached values are shared, so callers must not modify them.
+"""
+import hashlib
+import json
+import math
+import os
+import pickle
+import threading
+from collections import OrderedDict
+from dataclasses import fields, is_dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from motor_catalog import curve_hash
+from simulation import SIM_VERSION, BatchSummary, Motor, Rocket, SimConfig, Trajectory, simulate, simulate_batch
+
+
+def motor_hash(motor: Motor) -> str:
+    """ :return: The hash of the thrust curve of the motor, the same as the curve hash in the motor catalog. """
+    return curve_hash(np.column_stack([motor.times, motor.thrusts]))
+
+
+def canonical(value) -> Any:
+    """ Converts a value to a JSON-compatible form that only depends on its content. Numbers become floats (so 1 and
+    1.0 are equal), motors become their thrust curve hash and masses, dataclasses become dicts of their fields
+    and arrays become the hash of their bytes.
+    """
+    if isinstance(value, Motor):
+        return {'motor': motor_hash(value), 'prop_mass': float(value.prop_mass), 'dry_mass': float(value.dry_mass)}
+    if is_dataclass(value):
+        return {'type': type(value).__name__, **{f.name: canonical(getattr(value, f.name)) for f in fields(value)}}
+    if isinstance(value, np.ndarray):
+        data = np.ascontiguousarray(value, dtype=value.dtype.newbyteorder('<'))
+        return {'array': hashlib.sha256(data.tobytes()).hexdigest(), 'dtype': data.dtype.str, 'shape': data.shape}
+    if isinstance(value, dict):
+        return {str(k): canonical(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [canonical(v) for v in value]
+    if isinstance(value, (type, np.dtype)):
+        return {'dtype': np.dtype(value).str}
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, bool) or value is None or isinstance(value, str):
+        return value
+    if isinstance(value, (int, float)):
+        value = float(value)
+        return value if math.isfinite(value) else repr(value)
+    raise TypeError(f'Cannot build a cache key from {type(value).__name__}')
+
+
+def cache_key(kind: str, *args, **kwargs) -> str:
+    """ :param kind: What is computed, e.g. 'simulate'. Results of different kinds never share a key.
+    :param args: The inputs of the computation.
+    :param kwargs: More inputs by name.
+    :return: The hex SHA-256 key of the inputs.
+    """
+    payload = {'kind': kind, 'version': SIM_VERSION, 'args': canonical(args), 'kwargs': canonical(kwargs)}
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, separators=(',', ':')).encode('utf-8')).hexdigest()
+
+
+class SimCache:
+    def __init__(self, max_entries: int = 128, directory: Optional[str] = None, max_disk_bytes: int = 256 * 2 ** 20):
+        """ A two-tier cache: an in-memory LRU in front of an optional directory of pickled results.
+
+        :param max_entries: The maximum number of results in memory.
+        :param directory: The directory of the on-disk tier. Default: memory only.
+        :param max_disk_bytes: When the files in the directory take more than this, the least recently used ones are
+        deleted.
+        """
+        self.max_entries = max_entries
+        self.directory = directory
+        self.max_disk_bytes = max_disk_bytes
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> value
+        self._lock = threading.Lock()
+
+    def get(self, key: str, default=None):
+        """ :return: The cached result of the key, from memory or disk, or the default if there is none. """
+        with self._lock:
+            if key in self._entries:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return self._entries[key]
+        value = self._read(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return default
+            self.disk_hits += 1
+            self._remember(key, value)
+        return value
+
+    def put(self, key: str, value):
+        """ Caches the result in memory and, if there is a directory, on disk. """
+        with self._lock:
+            self._remember(key, value)
+        if self.directory:
+            self._write(key, value)
+
+    def get_or_compute(self, key: str, compute: Callable[[], Any]):
+        """ :return: The cached result of the key. On a miss it is computed and cached first. """
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        """ Empties both tiers and resets the statistics. """
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.disk_hits = self.misses = 0
+        for path, _ in self._disk_files():
+            _remove(path)
+
+    def stats(self) -> Dict[str, float]:
+        """ :return: The number of memory hits, disk hits and misses, the hit rate, the number of results in memory
+        and the number and size of the files on disk.
+        """
+        files = self._disk_files()
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {'hits': self.hits,
+                    'disk_hits': self.disk_hits,
+                    'misses': self.misses,
+                    'hit_rate': (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+                    'entries': len(self._entries),
+                    'disk_entries': len(files),
+                    'disk_bytes': sum(size for _, size in files)}
+
+    def _remember(self, key: str, value):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f'{key}.pkl')
+
+    def _read(self, key: str):
+        if not self.directory:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                value = pickle.load(f)
+            os.utime(path)  # Mark as recently used for the eviction
+            return value
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+            return None
+
+    def _write(self, key: str, value):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(key)
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        self._evict_disk()
+
+    def _disk_files(self) -> List[tuple]:
+        """ :return: The path and size of every cached file, least recently used first. """
+        if not self.directory or not os.path.isdir(self.directory):
+            return []
+        files = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.pkl'):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue  # Deleted by another process
+                files.append((stat.st_mtime_ns, entry.path, stat.st_size))
+        return [(path, size) for _, path, size in sorted(files)]
+
+    def _evict_disk(self):
+        files = self._disk_files()
+        total = sum(size for _, size in files)
+        for path, size in files:
+            if total <= self.max_disk_bytes:
+                break
+            _remove(path)
+            total -= size
+
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def simulate_cached(rocket: Rocket, motor: Motor, config: SimConfig = None) -> Trajectory:
+    """ simulation.simulate through the process-wide cache. """
+    config = config or SimConfig()
+
+    def compute():
+        trajectory = simulate(rocket, motor, config)
+        trajectory.shrink()
+        return trajectory
+
+    return cache.get_or_compute(cache_key('simulate', rocket, motor, config), compute)
+
+
+def simulate_batch_cached(motors: List[Motor], *args, config: SimConfig = None, **kwargs) -> BatchSummary:
+    """ simulation.simulate_batch through the process-wide cache. Takes the same arguments. """
+    config = config or SimConfig()
+    key = cache_key('simulate_batch', motors, *args, config=config, **kwargs)
+    return cache.get_or_compute(key, lambda: simulate_batch(motors, *args, config=config, **kwargs))
+
+
+# The process-wide cache of the app
+cache_directory = os.path.join('cache', 'simulations')
+cache = SimCache(directory=cache_directory)
@@ -0,0 +1,906 @@
+""" Flight simulation, independent of the Dash app.
+
+Usage from a script::
+
+    import thrust_curve as tc
+    from simulation import Motor, Rocket, SimConfig, simulate, simulate_batch
+
+    motor = Motor.from_thrust_curve(tc.get_thrust_curve('Estes_D12.eng'))
+    trajectory = simulate(Rocket(mass=0.1, diameter=0.035), motor)
+    print(trajectory.apogee, trajectory.events['apogee'])
+
+    # 1000 masses at once
+    summary = simulate_batch([motor], np.linspace(0.05, 0.5, 1000), 0.035, 0.3, 1, 5)
+    print(summary.apogee.max())
+"""
+import math
+import threading
+from bisect import bisect_right
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from atmosphere import Atmosphere, atmosphere, sea_level_density
+from constants import g
+
+# Bump whenever a change to the simulation changes its results, so that cached results are not reused
+SIM_VERSION = 6
+
+# Drag coefficient of the rocket body
+body_drag_coefficient = 0.5
+# The time step (s) of the thrust and mass tables of the motors, and the largest number of entries of a table. Motors
+# that burn longer than the largest table get a coarser time step.
+motor_table_dt = 0.001
+motor_table_size = 8192
+# The largest number of motor tables that are kept per process, so that a sweep over every motor reuses them
+max_motor_tables = 1024
+# A descent counts as at terminal velocity once its velocity is within this fraction of the terminal velocity at its
+# altitude. It lags a little behind, because the terminal velocity slows down as the air gets denser.
+terminal_tolerance = 1e-3
+
+# Flight phases in Trajectory.phase
+PHASE_BURN = 0
+PHASE_COAST = 1
+PHASE_DESCENT = 2
+
+# The integrators that simulate accepts in SimConfig.integrator
+INTEGRATORS = ('euler', 'rk4', 'rk45')
+
+# Butcher tableaus: nodes, coefficient rows, weights and the weights of the error estimate (None if there is none)
+_RK4 = ((0, 1 / 2, 1 / 2, 1),
+        ((), (1 / 2,), (0, 1 / 2), (0, 0, 1)),
+        (1 / 6, 1 / 3, 1 / 3, 1 / 6),
+        None)
+# Dormand-Prince 5(4). The last stage is evaluated at the fifth order solution.
+_DOPRI5 = ((0, 1 / 5, 3 / 10, 4 / 5, 8 / 9, 1, 1),
+           ((),
+            (1 / 5,),
+            (3 / 40, 9 / 40),
+            (44 / 45, -56 / 15, 32 / 9),
+            (19372 / 6561, -25360 / 2187, 64448 / 6561, -212 / 729),
+            (9017 / 3168, -355 / 33, 46732 / 5247, 49 / 176, -5103 / 18656),
+            (35 / 384, 0, 500 / 1113, 125 / 192, -2187 / 6784, 11 / 84)),
+           (35 / 384, 0, 500 / 1113, 125 / 192, -2187 / 6784, 11 / 84, 0),
+           (71 / 57600, 0, -71 / 16695, 71 / 1920, -17253 / 339200, 22 / 525, -1 / 40))
+
+
+@dataclass
+class Rocket:
+    """ The rocket, in SI units. The keys are the same as in the rocket-builder-data store. """
+    mass: float = 0.1  # kg, without the motor
+    diameter: float = 0.05  # m
+    drag_coefficient: float = body_drag_coefficient
+    parachute_diameter: float = 50  # m
+    parachute_drag_coefficient: float = 1
+    parachute_deploy_delay: float = 5  # s after burnout
+
+    @classmethod
+    def from_data(cls, data: dict) -> 'Rocket':
+        """ :param data: The rocket-builder-data store. Missing keys get the default values.
+        :return: The rocket.
+        """
+        data = data or {}
+        return cls(**{key: data[key] for key in cls.__dataclass_fields__ if key in data})
+
+
+@dataclass
+class Motor:
+    """ The thrust curve of a motor. The times should be sorted and start at 0. """
+    times: np.ndarray  # s
+    thrusts: np.ndarray  # N
+    name: str = ''
+    prop_mass: float = 0.0  # kg, the propellant that burns. 0 keeps the mass of the rocket constant.
+    dry_mass: float = 0.0  # kg, the mass of the motor without its propellant
+    _table: Optional['MotorTable'] = field(default=None, init=False, repr=False, compare=False)
+
+    @classmethod
+    def from_thrust_curve(cls, thrust_curve) -> 'Motor':
+        """ :param thrust_curve: A thrust_curve.ThrustCurve.
+        :return: The motor.
+        """
+        times, thrusts = thrust_curve.thrust_curve_arrays
+        return cls(np.asarray(times, dtype=float), np.asarray(thrusts, dtype=float), str(thrust_curve),
+                   float(thrust_curve.prop_mass), max(float(thrust_curve.dry_mass), 0.0))
+
+    @property
+    def burnout(self) -> float:
+        return float(self.times[-1])
+
+    @property
+    def table(self) -> 'MotorTable':
+        """ The thrust and mass tables of the motor, built on first access. """
+        if self._table is None:
+            self._table = motor_table(self)
+        return self._table
+
+    def __getstate__(self) -> dict:
+        # The table is looked up again where it is needed rather than pickled, e.g. to the processes of a pool
+        return {**self.__dict__, '_table': None}
+
+
+class MotorTable:
+    def __init__(self, motor: Motor):
+        """ The thrust, the cumulative impulse and the remaining propellant mass of a motor on a uniform time grid from
+        t = 0 to burnout, so they can be looked up at any time in O(1), without searching the thrust curve.
+
+        The thrust follows the thrust curve linearly between its points, from 0 N at t = 0. The impulse is its exact
+        integral. The propellant burns in proportion to the impulse, from motor.prop_mass at t = 0 to none at burnout.
+
+        :param motor: The motor.
+        """
+        times, thrusts = np.asarray(motor.times, dtype=float), np.asarray(motor.thrusts, dtype=float)
+        if times[0] > 0:
+            times, thrusts = np.concatenate([[0.0], times]), np.concatenate([[0.0], thrusts])
+        burnout = float(times[-1])
+        cells = min(max(math.ceil(burnout / motor_table_dt - 1e-9), 1), motor_table_size - 1)
+        self.times = np.linspace(0, burnout, cells + 1)
+        self.dt = burnout / cells
+        self.thrust = np.interp(self.times, times, thrusts)
+        # The impulse at the points of the thrust curve, and in between the integral of the linear thrust
+        curve_impulse = np.concatenate([[0.0], np.cumsum(np.diff(times) * (thrusts[1:] + thrusts[:-1]) / 2)])
+        k = np.clip(np.searchsorted(times, self.times, side='right') - 1, 0, len(times) - 2)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            slopes = np.where(np.diff(times) > 0, np.diff(thrusts) / np.diff(times), 0.0)
+        s = self.times - times[k]
+        self.impulse = curve_impulse[k] + thrusts[k] * s + slopes[k] / 2 * s * s
+        self.total_impulse = float(curve_impulse[-1])
+        self.burned = self.impulse / self.total_impulse if self.total_impulse > 0 else np.zeros_like(s)
+        self.propellant = motor.prop_mass * (1 - self.burned)
+        self.inverse_dt = 1 / self.dt if self.dt > 0 else 0.0
+        self.cells = cells
+        # The tables as lists for thrust_at and burned_at, made on first use: indexing lists is faster than indexing
+        # arrays for single floats
+        self._thrust_list: Optional[List[float]] = None
+        self._burned_list: Optional[List[float]] = None
+
+    def _at(self, values: List[float], t: float) -> float:
+        x = t * self.inverse_dt
+        if x <= 0:
+            return values[0]
+        if x >= self.cells:
+            return values[-1]
+        k = int(x)
+        value = values[k]
+        return value + (x - k) * (values[k + 1] - value)
+
+    def thrust_at(self, t: float) -> float:
+        """ :return: The thrust (N) at time t (s). """
+        if self._thrust_list is None:
+            self._thrust_list = self.thrust.tolist()
+        return self._at(self._thrust_list, t)
+
+    def burned_at(self, t: float) -> float:
+        """ :return: The fraction of the propellant that has burned at time t (s). """
+        if self._burned_list is None:
+            self._burned_list = self.burned.tolist()
+        return self._at(self._burned_list, t)
+
+    def lookup(self, times: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """ :param times: An array of times (s).
+        :return: The thrust (N) and the burned fraction of the propellant at those times, like thrust_at and burned_at.
+        """
+        x = np.clip(np.asarray(times, dtype=float) * self.inverse_dt, 0, self.cells)
+        k = np.minimum(x.astype(np.intp), self.cells - 1)
+        f = x - k
+        return (self.thrust[k] + f * (self.thrust[k + 1] - self.thrust[k]),
+                self.burned[k] + f * (self.burned[k + 1] - self.burned[k]))
+
+
+# The motor tables that have been built in this process, by thrust curve and propellant mass, least recently used first
+_motor_tables: 'OrderedDict[Tuple[bytes, bytes, float], MotorTable]' = OrderedDict()
+_motor_tables_lock = threading.Lock()
+
+
+def motor_table(motor: Motor) -> MotorTable:
+    """ :return: The table of the motor, shared by every motor with the same thrust curve and propellant mass, e.g. the
+        motors that Motor.from_thrust_curve builds for each flight, or that are unpickled in the processes of a pool.
+    """
+    key = (np.ascontiguousarray(motor.times, dtype=float).tobytes(),
+           np.ascontiguousarray(motor.thrusts, dtype=float).tobytes(), float(motor.prop_mass))
+    with _motor_tables_lock:
+        table = _motor_tables.get(key)
+        if table is not None:
+            _motor_tables.move_to_end(key)
+            return table
+    # Built outside of the lock, so that other threads are not blocked. Two threads may build the same table.
+    table = MotorTable(motor)
+    with _motor_tables_lock:
+        table = _motor_tables.setdefault(key, table)
+        _motor_tables.move_to_end(key)
+        while len(_motor_tables) > max_motor_tables:
+            _motor_tables.popitem(last=False)
+    return table
+
+
+def burnout_mass(mass, motor_mass):
+    """ :param mass: The mass of the rocket without its motor (kg). A number or an array.
+    :param motor_mass: The mass of the motor without its propellant (kg). A number or an array.
+    :return: The mass of the rocket with its empty motor (kg), after burnout. At liftoff the propellant of the motor
+    comes on top of it.
+    :raises ValueError: If a rocket and its empty motor have no mass.
+    """
+    mass = np.asarray(mass, dtype=float) + np.asarray(motor_mass, dtype=float)
+    if (mass <= 0).any():
+        raise ValueError(f'The mass of the rocket with its empty motor ({mass.flat[np.argmax(mass <= 0)]:g} kg) should '
+                         f'be more than 0')
+    return mass
+
+
+@dataclass
+class SimConfig:
+    # s, the step size of euler and rk4, and the first step of rk45. The last burn step of euler ends at burnout.
+    dt: float = 0.01
+    decimation: int = 1  # Only record every n-th step. Burnout, chute deployment and landing are always recorded.
+    max_time: float = 3600  # s, stop the simulation if the rocket hasn't landed by then.
+    # One of INTEGRATORS. euler and rk4 blow up if dt is too large for the drag (e.g. a large chute on a light rocket),
+    # rk45 adapts its step size to it.
+    integrator: str = 'euler'
+    rtol: float = 1e-6  # Relative error tolerance per rk45 step
+    atol: float = 1e-6  # Absolute error tolerance per rk45 step, in m and m/s
+    max_step: float = 1.0  # s, the largest rk45 step
+    launch_elevation: float = 0.0  # m above sea level, the air gets thinner higher up
+    temperature_offset: float = 0.0  # K, the difference of the air temperature from the standard atmosphere
+
+    @property
+    def atmosphere(self) -> Atmosphere:
+        """ :return: The tabulated atmosphere above the launch site. """
+        return atmosphere(self.launch_elevation, self.temperature_offset)
+
+
+class Trajectory:
+    """ A flight recorded into a preallocated ndarray with the columns t (s), y (m), v (m/s), a (m/s^2) and phase.
+    The array grows by doubling when it is full.
+    """
+    columns = ('t', 'y', 'v', 'a', 'phase')
+    # The events of a flight, and the keys of summary. Events that a flight doesn't have are missing from its summary.
+    event_names = ('burnout', 'apogee', 'chute_deploy', 'landing')
+    summary_keys = ('apogee', 'max_velocity', 'max_acceleration', 'flight_time') + \
+        tuple(f't_{name}' for name in event_names)
+
+    def __init__(self, capacity: int = 1024, decimation: int = 1):
+        self.data = np.empty((max(capacity, 1), len(self.columns)))
+        self.size = 0
+        self.decimation = max(int(decimation), 1)
+        # Times (s) of burnout, apogee, chute_deploy and landing
+        self.events: Dict[str, float] = {}
+        self.apogee = 0.0  # m
+        # The steps blew up, e.g. rk4 with a dt that is too large for a huge chute. The flight ends where they did,
+        # without a landing.
+        self.diverged = False
+        self.steps = 0  # The number of integration steps, including rejected rk45 steps
+
+    def record(self, t, y, v, a, phase: int):
+        """ Records a block of consecutive steps. The block is decimated, but its last step is always kept.
+
+        :param t: The times of the steps. An array or list.
+        :param y: The altitudes.
+        :param v: The velocities.
+        :param a: The accelerations.
+        :param phase: The flight phase of all steps.
+        """
+        n = len(y)
+        if n == 0:
+            return
+        rows = np.arange(0, n, self.decimation)
+        if rows[-1] != n - 1:
+            rows = np.append(rows, n - 1)
+        end = self.size + len(rows)
+        if end > len(self.data):
+            grown = np.empty((max(end, 2 * len(self.data)), len(self.columns)))
+            grown[:self.size] = self.data[:self.size]
+            self.data = grown
+        block = self.data[self.size:end]
+        for i, values in enumerate((t, y, v, a)):
+            block[:, i] = values if self.decimation == 1 else np.asarray(values)[rows]
+        block[:, 4] = phase
+        self.size = end
+
+    def __len__(self):
+        return self.size
+
+    def shrink(self):
+        """ Frees the unused capacity, e.g. before the trajectory is cached. """
+        self.data = self.data[:self.size].copy()
+
+    def column(self, name: str) -> np.ndarray:
+        return self.data[:self.size, self.columns.index(name)]
+
+    @property
+    def t(self) -> np.ndarray:
+        return self.column('t')
+
+    @property
+    def y(self) -> np.ndarray:
+        return self.column('y')
+
+    @property
+    def v(self) -> np.ndarray:
+        return self.column('v')
+
+    @property
+    def a(self) -> np.ndarray:
+        return self.column('a')
+
+    @property
+    def phase(self) -> np.ndarray:
+        return self.column('phase')
+
+    def summary(self) -> Dict[str, float]:
+        """ :return: The apogee (m), max velocity (m/s), max acceleration (m/s^2), flight time (s) and the event
+        times.
+        """
+        summary = {'apogee': self.apogee,
+                   'max_velocity': float(self.v.max()) if self.size else 0.0,
+                   'max_acceleration': float(self.a.max()) if self.size else 0.0,
+                   'flight_time': float(self.t[-1]) if self.size else 0.0}
+        summary.update({f't_{name}': time for name, time in self.events.items()})
+        return summary
+
+
+@dataclass
+class BatchSummary:
+    """ The summaries of the flights of simulate_batch. Element i of every array belongs to flight i. """
+    apogee: np.ndarray  # m
+    t_apogee: np.ndarray  # s
+    max_velocity: np.ndarray  # m/s
+    max_acceleration: np.ndarray  # m/s^2
+    flight_time: np.ndarray  # s, max_time for flights that haven't landed by then
+    landing_speed: np.ndarray  # m/s, NaN for flights that haven't landed
+
+    def __len__(self):
+        return len(self.apogee)
+
+    def flight(self, i: int) -> Dict[str, float]:
+        """ :return: The summary of flight i. """
+        return {name: getattr(self, name)[i].item() for name in self.__dataclass_fields__}
+
+
+def simulate(rocket: Rocket, motor: Motor, config: SimConfig = None) -> Trajectory:
+    """ Simulates the flight of the rocket with the integrator of the config.
+
+    euler takes explicit Euler steps of dt, the same physics as the original Plots page. During the burn the thrust
+    and the mass of every step come from the table of the motor, and the last step ends at burnout. After burnout the
+    rocket coasts with body drag until the chute deploys, then descends with chute drag until it lands. Once the
+    descent reaches terminal velocity the remaining steps are filled in at once.
+
+    The rocket lifts off with its motor and gets lighter as the propellant burns (see burnout_mass), and the drag of
+    every step uses the air density at the altitude of the rocket, from the atmosphere of the config. rk4 and rk45 are
+    described in _simulate_rk.
+
+    :param rocket: The rocket.
+    :param motor: The motor.
+    :param config: The simulation settings.
+    :return: The recorded flight.
+    :raises ValueError: If the rocket and its empty motor have no mass, see burnout_mass.
+    """
+    config = config or SimConfig()
+    if config.integrator not in INTEGRATORS:
+        raise ValueError(f'Unknown integrator {config.integrator!r}, expected one of {INTEGRATORS}')
+    if config.integrator != 'euler':
+        return _simulate_rk(rocket, motor, config)
+
+    dt = config.dt
+    c_body, c_chute = _drag_constants(rocket)
+    air = config.atmosphere
+    density_at = air.density_at
+    burnout = motor.burnout
+    times = np.minimum(np.arange(1, max(math.ceil(burnout / dt - 1e-9), 1) + 1) * dt, burnout)
+    thrusts, burned = motor.table.lookup(times)
+    masses = float(burnout_mass(rocket.mass, motor.dry_mass)) + motor.prop_mass * (1 - burned)
+    # Per step: its length, the acceleration from thrust and gravity, and the drag constant divided by the mass
+    steps = np.diff(times, prepend=0.0).tolist()
+    thrust_accelerations = (thrusts / masses - g).tolist()
+    drag_per_mass = (c_body / masses).tolist()
+    times = times.tolist()
+    trajectory = Trajectory(len(times) + int((rocket.parachute_deploy_delay + 60) / dt), config.decimation)
+
+    # Burn: the thrust and mass at the end of every step
+    ys, vs, accs = [], [], []
+    y = v = 0.0
+    for h, a_thrust, c_m in zip(steps, thrust_accelerations, drag_per_mass):
+        a = a_thrust - c_m * density_at(y) * v * abs(v)
+        v += a * h
+        y += v * h
+        if y < 0:
+            y = v = 0.0
+        ys.append(y)
+        vs.append(v)
+        accs.append(a)
+    trajectory.record(times, ys, vs, accs, PHASE_BURN)
+    trajectory.events['burnout'] = burnout
+    apogee_candidates = [(max(ys), times[ys.index(max(ys))])]
+
+    # Coast until the chute deploys, then descend until landing, without the burned propellant
+    m = masses[-1]
+    gm = g * m
+    n_coast = max(math.ceil(rocket.parachute_deploy_delay / dt - 1e-9), 0)
+    n_max = int(config.max_time / dt)
+    step = 0
+    for phase, c, n_phase in ((PHASE_COAST, c_body, n_coast), (PHASE_DESCENT, c_chute, n_max)):
+        n_phase = min(n_phase, n_max - step)
+        if y <= 0 or step >= n_max:
+            break
+        if n_phase <= 0:
+            continue  # The chute deploys at burnout
+        if phase == PHASE_DESCENT:
+            trajectory.events['chute_deploy'] = burnout + step * dt
+        ys, vs, accs = _fly(y, v, gm, m, c, air, dt, n_phase, terminal=phase == PHASE_DESCENT)
+        block_t = burnout + dt * np.arange(step + 1, step + len(ys) + 1)
+        trajectory.record(block_t, ys, vs, accs, phase)
+        i_max = int(np.argmax(ys))
+        apogee_candidates.append((float(ys[i_max]), float(block_t[i_max])))
+        step += len(ys)
+        y, v = float(ys[-1]), float(vs[-1])
+    trajectory.events['landing'] = burnout + step * dt
+    trajectory.steps = len(times) + step
+
+    trajectory.apogee, trajectory.events['apogee'] = max(apogee_candidates, key=lambda c: c[0])
+    return trajectory
+
+
+def _drag_constants(rocket: Rocket) -> Tuple[float, float]:
+    """ :return: The drag force divided by ρ v^2 (0.5 * Cd * A) of the body and of the chute. """
+    c_body = 0.5 * (rocket.drag_coefficient or body_drag_coefficient) * (rocket.diameter / 2) ** 2 * math.pi
+    c_chute = 0.5 * (rocket.parachute_drag_coefficient or body_drag_coefficient) * \
+        (rocket.parachute_diameter / 2) ** 2 * math.pi
+    return c_body, c_chute
+
+
+def _simulate_rk(rocket: Rocket, motor: Motor, config: SimConfig) -> Trajectory:
+    """ Simulates the flight with fixed rk4 steps or adaptive rk45 (Dormand-Prince) steps.
+
+    The thrust is interpolated linearly between the points of the thrust curve, starting from 0 N at t = 0. Steps end
+    exactly on every point of the thrust curve and on chute deployment, so the forces are smooth within every step and
+    burnout and deployment happen at their exact times. The mass during the burn comes from the table of the motor.
+    Apogee (v = 0) and landing (y = 0) are located by root finding on the step size, and the step that contains them
+    ends there. With rk45 the step size follows the error estimate, so long steps are taken where nothing happens.
+    Once the descent reaches terminal velocity the rest of it follows the terminal velocity down to landing.
+
+    :return: The recorded flight.
+    """
+    adaptive = config.integrator == 'rk45'
+    tableau = _DOPRI5 if adaptive else _RK4
+    burn_mass = motor.prop_mass
+    burned_at = motor.table.burned_at
+    # The mass and weight after burnout
+    m = float(burnout_mass(rocket.mass, motor.dry_mass))
+    gm = g * m
+    # The largest acceleration from the thrust and gravity, with the mass at its lowest
+    a_limit = max(motor.thrusts.max(), 0) / m + g
+    c_body, c_chute = _drag_constants(rocket)
+    air = config.atmosphere
+    density_at = air.density_at
+
+    knots = motor.times.tolist()
+    forces = motor.thrusts.tolist()
+    if knots[0] > 0:
+        knots.insert(0, 0.0)
+        forces.insert(0, 0.0)
+    burnout = knots[-1]
+    deploy = burnout + max(rocket.parachute_deploy_delay, 0)
+    # Every step ends on or before the next stop
+    stops = sorted({k for k in knots[1:] + [deploy] if k < config.max_time} | {config.max_time})
+
+    trajectory = Trajectory(256, config.decimation)
+    trajectory.events['burnout'] = burnout
+    apogee = (0.0, 0.0)
+    # The thrust of the current step is F0 + dF * (t - t0), and the drag is c * ρ(y) * v^2
+    F0 = dF = t0 = 0.0
+    c = c_body
+    lifted = False
+
+    def acceleration(t: float, y: float, v: float) -> float:
+        m_t = m + burn_mass * (1 - burned_at(t)) if t < burnout else m
+        a = (F0 + dF * (t - t0) - g * m_t - c * density_at(y) * v * abs(v)) / m_t
+        # The launch pad holds the rocket until the thrust is larger than the weight
+        return a if lifted or a > 0 else 0.0
+
+    t = y = v = 0.0
+    rows: List[tuple] = [(t, y, v, acceleration(t, y, v))]
+    phase = PHASE_BURN
+    i_stop = 0
+    h = config.dt
+    while i_stop < len(stops):
+        step_phase = PHASE_BURN if t < burnout else PHASE_COAST if t < deploy else PHASE_DESCENT
+        if step_phase != phase:
+            trajectory.record(*zip(*rows), phase)
+            if step_phase == PHASE_DESCENT:
+                trajectory.events['chute_deploy'] = t
+            rows, phase = [], step_phase
+        if phase == PHASE_BURN:
+            k = bisect_right(knots, t) - 1
+            t0, F0 = knots[k], forces[k]
+            dF = (forces[k + 1] - F0) / (knots[k + 1] - t0)
+        else:
+            F0 = dF = 0.0
+            c = c_body if phase == PHASE_COAST else c_chute
+            if not lifted:
+                break  # The thrust never lifted the rocket
+
+        stop = stops[i_stop]
+        clipped = h >= stop - t
+        h_step = stop - t if clipped else h
+        y1, v1, error = _rk_step(acceleration, t, y, v, h_step, tableau)
+        trajectory.steps += 1
+        if adaptive:
+            error = max(abs(error[0]) / (config.atol + config.rtol * max(abs(y), abs(y1))),
+                        abs(error[1]) / (config.atol + config.rtol * max(abs(v), abs(v1))))
+            factor = 5.0 if error == 0 else min(5.0, max(0.2, 0.9 * error ** -0.2))
+            if not error <= 1:
+                h = h_step * (factor if math.isfinite(error) else 0.2)
+                continue
+            if not clipped or factor < 1:
+                h = min(h_step * factor, config.max_step)
+        elif not (math.isfinite(y1) and math.isfinite(v1)) or abs(v1) > abs(v) + 2 * a_limit * h_step:
+            # The steps blew up (dt too large for the drag, e.g. a huge chute at high speed): the drag only slows the
+            # rocket down, so its speed can't grow faster than the thrust and gravity accelerate it
+            trajectory.diverged = True
+            if v > 0:
+                apogee = max(apogee, (y, t))  # Still climbing: the highest altitude that was reached
+            break
+
+        def step_to(s: float) -> Tuple[float, float]:
+            return _rk_step(acceleration, t, y, v, s, tableau)[:2]
+
+        landed = lifted and y1 <= 0
+        if landed:
+            h_step = _find_root(lambda s: step_to(s)[0], h_step, y, y1)
+            y1, v1 = 0.0, step_to(h_step)[1]
+            clipped = False
+        elif v > 0 >= v1:
+            h_step = _find_root(lambda s: step_to(s)[1], h_step, v, v1)
+            y1, v1 = step_to(h_step)[0], 0.0
+            clipped = False
+            apogee = max(apogee, (y1, t + h_step))
+
+        t = stop if clipped else t + h_step
+        y, v = y1, v1
+        if clipped:
+            i_stop += 1
+        lifted = lifted or y > 0
+        rows.append((t, y, v, acceleration(t, y, v)))
+        if landed:
+            break
+        if phase == PHASE_DESCENT and c > 0:  # Without a chute there is no terminal velocity
+            v_terminal = math.sqrt(gm / (c * density_at(y)))
+            if abs(v + v_terminal) <= terminal_tolerance * v_terminal:
+                # Terminal velocity: the rest of the descent is calculated directly. Explicit steps would have to stay
+                # tiny there to remain stable under the strong chute drag.
+                t_land = t + float(air.descent_time(y, c, gm))
+                y = 0.0 if t_land <= config.max_time else float(air.descent_altitudes(y, c, gm, config.max_time - t))
+                t = min(t_land, config.max_time)
+                rows.append((t, y, -math.sqrt(gm / (c * density_at(y))), 0.0))
+                break
+    if rows:
+        trajectory.record(*zip(*rows), phase)
+    if not trajectory.diverged:
+        trajectory.events['landing'] = t
+
+    trajectory.apogee, trajectory.events['apogee'] = apogee
+    return trajectory
+
+
+def _rk_step(acceleration: Callable[[float, float, float], float], t: float, y: float, v: float, h: float,
+             tableau: tuple) -> Tuple[float, float, Optional[Tuple[float, float]]]:
+    """ Takes one explicit Runge-Kutta step of y' = v, v' = acceleration(t, y, v).
+
+    :param tableau: The Butcher tableau, _RK4 or _DOPRI5.
+    :return: The altitude and velocity after the step, and the error estimates of both (None if the tableau has no
+    error weights).
+    """
+    nodes, matrix, weights, error_weights = tableau
+    ky, kv = [], []
+    for node, row in zip(nodes, matrix):
+        yi = y + h * sum(a * k for a, k in zip(row, ky))
+        vi = v + h * sum(a * k for a, k in zip(row, kv))
+        ky.append(vi)
+        kv.append(acceleration(t + node * h, yi, vi))
+    y1 = y + h * sum(b * k for b, k in zip(weights, ky))
+    v1 = v + h * sum(b * k for b, k in zip(weights, kv))
+    if error_weights is None:
+        return y1, v1, None
+    return y1, v1, (h * sum(e * k for e, k in zip(error_weights, ky)),
+                    h * sum(e * k for e, k in zip(error_weights, kv)))
+
+
+def _find_root(func: Callable[[float], float], h: float, f_start: float, f_end: float,
+               xtol: float = 1e-10) -> float:
+    """ Finds the step size s in (0, h] at which func(s) crosses zero with the Illinois variant of regula falsi.
+
+    :param func: The event value (altitude or velocity) after a step of size s.
+    :param f_start: func(0), which is positive.
+    :param f_end: func(h), which is zero or negative.
+    :return: The step size.
+    """
+    lo, hi, f_lo, f_hi = 0.0, h, f_start, f_end
+    x, fx = hi, f_hi
+    side = 0
+    for _ in range(100):
+        if fx == 0 or hi - lo <= xtol:
+            break
+        x = (lo * f_hi - hi * f_lo) / (f_hi - f_lo)
+        fx = func(x)
+        if fx > 0:
+            lo, f_lo = x, fx
+            if side == -1:
+                f_hi /= 2
+            side = -1
+        else:
+            hi, f_hi = x, fx
+            if side == 1:
+                f_lo /= 2
+            side = 1
+    return x
+
+
+def _fly(y: float, v: float, gm: float, m: float, c: float, air: Atmosphere, dt: float, n_steps: int, terminal: bool,
+         min_chunk: int = 256, max_chunk: int = 256) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """ Takes up to n_steps Euler steps without thrust, stopping at landing.
+
+    Only the velocity, and the altitude for the air density, run through a Python loop. The altitudes and
+    accelerations are calculated from the velocities per chunk with NumPy; np.cumsum adds sequentially, so the
+    altitudes are the same as the ones of the loop. While descending, a chunk is at most as long as the rocket needs
+    to land (it never falls faster than its current or its terminal velocity), so few steps are wasted.
+
+    :param c: The drag force divided by ρ v^2.
+    :param air: The atmosphere.
+    :param terminal: Whether to check for terminal velocity. Once the rocket falls at its terminal velocity, the rest
+    of the steps are filled in at once.
+    :return: The altitudes, velocities and accelerations after every step.
+    """
+    y_chunks, v_chunks, a_chunks = [], [], []
+    density_at = air.density_at
+    # The change of velocity of a step from the drag, per unit of air density and velocity squared, and from gravity
+    c_dt, g_dt = c / m * dt, gm / m * dt
+    done = 0
+    # Without drag (e.g. no chute) there is no terminal velocity
+    terminal = terminal and c > 0
+    while done < n_steps:
+        # The fastest terminal velocity below the rocket
+        v_terminal = math.sqrt(gm / (c * density_at(y))) if c > 0 else math.inf
+        n = min_chunk
+        if v <= 0:
+            n = max(n, int(y / (max(-v, v_terminal) * dt)))
+            if terminal:
+                n = min(n, max_chunk)  # Check for terminal velocity every now and then
+        n = min(n, n_steps - done)
+        y_start, v_start = y, v
+        try:
+            velocities = _coast_steps(y, v, c_dt, g_dt, dt, n, air)
+        except (IndexError, ValueError, OverflowError):
+            # Above the top of the density table, or the steps blew up
+            velocities = _coast_steps(y, v, c_dt, g_dt, dt, n, air, checked=True)
+        vs = np.fromiter(velocities, dtype=float, count=n)
+        with np.errstate(over='ignore', invalid='ignore'):
+            ys = np.cumsum(np.concatenate([[y_start], vs * dt]))[1:]
+            y, v = float(ys[-1]), float(vs[-1])
+            v_terminal = math.sqrt(gm / (c * density_at(y))) if terminal else math.inf
+            if terminal and v < 0 and abs(v + v_terminal) <= terminal_tolerance * v_terminal:
+                # Terminal velocity: fill in the remaining steps up to landing at the terminal velocity
+                n_tail = min(math.ceil(float(air.descent_time(y, c, gm)) / dt) + 1, n_steps - done - n)
+                ys_tail = air.descent_altitudes(y, c, gm, dt * np.arange(1, max(n_tail, 0) + 1))
+                vs = np.concatenate([vs, np.diff(ys_tail, prepend=y) / dt])
+                ys = np.concatenate([ys, ys_tail])
+            # The acceleration of a step is its change of velocity
+            accs = np.diff(vs, prepend=v_start) / dt
+        # Stop at landing, or when the steps blew up (dt too large for the drag, e.g. a huge chute at high speed)
+        landing = np.flatnonzero((ys <= 0) | ~np.isfinite(ys))
+        if len(landing):
+            end = landing[0] + 1
+            ys, vs, accs = ys[:end], vs[:end], accs[:end]
+            if ys[-1] < 0:
+                ys[-1] = vs[-1] = 0.0
+        y_chunks.append(ys)
+        v_chunks.append(vs)
+        a_chunks.append(accs)
+        done += len(ys)
+        y, v = float(ys[-1]), float(vs[-1])
+        if len(landing):
+            break
+    return np.concatenate(y_chunks), np.concatenate(v_chunks), np.concatenate(a_chunks)
+
+
+def _coast_steps(y: float, v: float, c_dt: float, g_dt: float, dt: float, n: int, air: Atmosphere,
+                 checked: bool = False) -> List[float]:
+    """ The Python loop of _fly: n Euler steps without thrust.
+
+    :param c_dt: The change of velocity of a step from the drag, per unit of air density and velocity squared.
+    :param g_dt: The change of velocity of a step from gravity.
+    :param checked: Look the air density up with air.density_at. Otherwise the density table is indexed directly,
+    which raises an exception above the table or once the steps have blown up. Below the launch site it gives wrong
+    densities, but those steps come after landing and are dropped.
+    :return: The velocities after every step.
+    """
+    velocities = []
+    append = velocities.append
+    if checked:
+        density_at = air.density_at
+        for _ in range(n):
+            v -= c_dt * density_at(y) * v * abs(v) + g_dt
+            y += v * dt
+            append(v)
+        return velocities
+    densities, inverse_step = air.density_list, air.inverse_step
+    for _ in range(n):
+        v -= c_dt * densities[int(y * inverse_step + 0.5)] * v * abs(v) + g_dt
+        y += v * dt
+        append(v)
+    return velocities
+
+
+def simulate_batch(motors: List[Motor], mass, diameter, parachute_diameter, parachute_drag_coefficient,
+                   parachute_deploy_delay, motor_index=0, drag_coefficient=body_drag_coefficient, thrust_scale=1,
+                   config: SimConfig = None, dtype=np.float64) -> BatchSummary:
+    """ Simulates many flights at once with Euler steps of config.dt, all flights in lockstep.
+
+    The rocket parameters are scalars or arrays that broadcast to the number of flights. The thrust and burned
+    propellant of every flight come from the table of its motor at the end of every step; the tables of all motors are
+    placed end to end in one array, so every flight looks them up with one index calculation (a batch with one motor
+    looks them up once per step). The mass drops as the propellant burns. The drag is semi-implicit
+    (c * |v_old| * v_new), so the steps don't blow up when a chute opens at high speed, and it has the same terminal
+    velocity as explicit steps. The air density of every step is looked up at the altitude of every flight. Flights
+    that have landed are dropped from the state arrays. Once a descent reaches terminal velocity its landing is
+    calculated directly.
+
+    :param motors: The motors to choose from.
+    :param mass: The masses of the rockets without their motors (kg).
+    :param diameter: The diameters of the rockets (m).
+    :param parachute_diameter: The chute diameters (m).
+    :param parachute_drag_coefficient: The chute drag coefficients. 0 uses body_drag_coefficient, like simulate.
+    :param parachute_deploy_delay: The times between burnout and chute deployment (s).
+    :param motor_index: The index into motors of the motor of every flight.
+    :param drag_coefficient: The drag coefficients of the rocket bodies. 0 uses body_drag_coefficient.
+    :param thrust_scale: Multiplies the thrust, and so the total impulse, of the motor of every flight.
+    :param config: The simulation settings. The integrator, decimation and rk45 tolerances aren't used.
+    :param dtype: np.float32 halves the memory of very large batches at the cost of precision.
+    :return: The summaries of the flights.
+    :raises ValueError: If a rocket and its empty motor have no mass, see burnout_mass.
+    """
+    config = config or SimConfig()
+    dt = config.dt
+    air = config.atmosphere
+    dtype = np.dtype(dtype)
+    mass, diameter, chute_d, chute_cd, delay, motor_index, body_cd, thrust_scale = np.broadcast_arrays(
+        *(np.ravel(x) for x in (mass, diameter, parachute_diameter, parachute_drag_coefficient,
+                                parachute_deploy_delay, motor_index, drag_coefficient, thrust_scale)))
+    n = len(mass)
+
+    # The tables of all motors end to end
+    tables = [motor.table for motor in motors]
+    burnouts = np.array([motor.burnout for motor in motors])
+    table_thrust = np.concatenate([table.thrust for table in tables])
+    table_burned = np.concatenate([table.burned for table in tables])
+    table_cells = np.array([table.cells for table in tables])
+    table_start = np.concatenate([[0], np.cumsum(table_cells + 1)[:-1]])
+    table_inverse_dt = np.array([table.inverse_dt for table in tables])
+
+    # Like _drag_constants, a drag coefficient of 0 stands for the default
+    body_cd = np.where(body_cd == 0, body_drag_coefficient, body_cd)
+    chute_cd = np.where(chute_cd == 0, body_drag_coefficient, chute_cd)
+    motor_index = motor_index.astype(np.intp)
+    burn_mass = np.array([motor.prop_mass for motor in motors])[motor_index]
+    empty_mass = burnout_mass(mass, np.array([motor.dry_mass for motor in motors])[motor_index])
+    single_motor = bool(np.all(motor_index == motor_index[0])) if n else True
+    area = np.pi * (diameter / 2) ** 2
+    chute_area = np.pi * (chute_d / 2) ** 2
+    # The per-flight state and constants. Rows are dropped once their flight is done.
+    state = {'flight': np.arange(n),
+             'y': np.zeros(n, dtype),
+             'v': np.zeros(n, dtype),
+             # At liftoff
+             'mass': (empty_mass + burn_mass).astype(dtype),
+             'burn_mass': burn_mass.astype(dtype),
+             # After burnout
+             'gm': (g * empty_mass).astype(dtype),
+             'dt_m': (dt / empty_mass).astype(dtype),
+             'c_body': (0.5 * body_cd * area).astype(dtype),
+             'c_chute': (0.5 * chute_cd * chute_area).astype(dtype),
+             'burnout': burnouts[motor_index],
+             'deploy': burnouts[motor_index] + np.maximum(delay, 0),
+             'motor': motor_index,
+             'thrust_scale': thrust_scale.astype(dtype),
+             'lifted': np.zeros(n, dtype=bool),
+             'apogee': np.zeros(n, dtype),
+             't_apogee': np.zeros(n, dtype),
+             'max_velocity': np.zeros(n, dtype),
+             'max_acceleration': np.zeros(n, dtype)}
+    summary = BatchSummary(*(np.zeros(n, dtype) for _ in BatchSummary.__dataclass_fields__))
+
+    def table_at(motor, t: float) -> Tuple[np.ndarray, np.ndarray]:
+        """ :return: The thrust and burned fraction at time t of the motor (an index or an array of indices). """
+        x = np.minimum(t * table_inverse_dt[motor], table_cells[motor])
+        cell = np.minimum(x.astype(np.intp), table_cells[motor] - 1)
+        i = table_start[motor] + cell
+        f = x - cell
+        return (table_thrust[i] + f * (table_thrust[i + 1] - table_thrust[i]),
+                table_burned[i] + f * (table_burned[i + 1] - table_burned[i]))
+
+    def finish(rows: np.ndarray, flight_time: np.ndarray, landing_speed):
+        flights = state['flight'][rows]
+        for name in ('apogee', 't_apogee', 'max_velocity', 'max_acceleration'):
+            getattr(summary, name)[flights] = state[name][rows]
+        summary.flight_time[flights] = flight_time
+        summary.landing_speed[flights] = landing_speed
+
+    n_max = int(config.max_time / dt)
+    with np.errstate(over='ignore', invalid='ignore', divide='ignore'):
+        for k in range(1, n_max + 1):
+            if not len(state['flight']):
+                break
+            t = k * dt
+            y, v = state['y'], state['v']
+            burning = t - dt < state['burnout']
+            if not burning.any():
+                thrust = 0
+                dt_m = state['dt_m']
+            elif single_motor:
+                thrust_now, burned_now = table_at(state['motor'][0], t)
+                thrust = state['thrust_scale'] * dtype.type(thrust_now)
+                dt_m = dt / (state['mass'] - state['burn_mass'] * dtype.type(burned_now))
+            else:
+                rows = np.flatnonzero(burning)
+                thrust_now, burned_now = table_at(state['motor'][rows], t)
+                thrust = np.zeros(len(y), dtype)
+                thrust[rows] = state['thrust_scale'][rows] * thrust_now
+                dt_m = state['dt_m'].copy()
+                dt_m[rows] = dt / (state['mass'][rows] - state['burn_mass'][rows] * burned_now)
+            deployed = t - dt >= state['deploy']
+            c = np.where(deployed, state['c_chute'], state['c_body']) * air.density(y).astype(dtype, copy=False)
+            # The drag uses the new velocity times the old speed, which keeps large chutes stable at any dt
+            v_new = (v + (thrust * dt_m - g * dt)) / (1 + c * np.abs(v) * dt_m)
+            a = (v_new - v) / dt
+            v = v_new
+            y = y + v * dt
+
+            lifted = state['lifted']
+            on_pad = ~lifted & (y <= 0)
+            y[on_pad] = v[on_pad] = 0
+            state['y'], state['v'] = y, v
+            lifted |= y > 0
+            higher = y > state['apogee']
+            state['apogee'] = np.where(higher, y, state['apogee'])
+            state['t_apogee'] = np.where(higher, dtype.type(t), state['t_apogee'])
+            np.maximum(state['max_velocity'], v, out=state['max_velocity'])
+            np.maximum(state['max_acceleration'], a, out=state['max_acceleration'])
+
+            # Landed (interpolated between the last two steps), never lifted off or at terminal velocity
+            landed = (lifted & (y <= 0)) | ~np.isfinite(y)
+            stuck = on_pad & ~burning
+            v_terminal = np.sqrt(state['gm'] / c)
+            # Without drag (no chute) there is no terminal velocity
+            terminal = deployed & (c > 0) & ~landed & (v < 0) & \
+                (np.abs(v + v_terminal) <= terminal_tolerance * v_terminal)
+            done = landed | stuck | terminal
+            if done.any():
+                rows = np.flatnonzero(landed)
+                finish(rows, t - np.where(v[rows] < 0, y[rows] / v[rows], 0), np.abs(v[rows]))
+                rows = np.flatnonzero(stuck)
+                finish(rows, t, 0)
+                rows = np.flatnonzero(terminal)
+                gm, c_chute = state['gm'][rows], state['c_chute'][rows]
+                flight_time = t + air.descent_time(y[rows], c_chute, gm)
+                finish(rows, np.minimum(flight_time, n_max * dt),
+                       np.where(flight_time <= n_max * dt, np.sqrt(gm / (c_chute * air.ground_density)), np.nan))
+                state = {name: values[~done] for name, values in state.items()}
+    finish(np.arange(len(state['flight'])), n_max * dt, np.nan)
+    return summary
+
+
+def calc_drag_force(v: float, d: float, Cd=body_drag_coefficient, density: float = sea_level_density):
+    """ F_drag = 0.5 * Cd * ρ * v^2 * A
+
+    https://www.grc.nasa.gov/www/k-12/airplane/drageq.html
+
+    :param v: Velocity
+    :param d: Diameter
+    :param Cd: Drag coefficient
+    :param density: The air density ρ, e.g. from atmosphere.Atmosphere.density. Default: the standard density at sea
+    level.
+    :return: The drag force
+    """
+    direction = 1
+    if v > 0:
+        direction = -1
+    return direction * 0.5 * Cd * density * (v ** 2) * ((d / 2) ** 2 * math.pi)
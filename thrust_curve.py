@@ -1,18 +1,30 @@
+import logging
+import multiprocessing
 import os
+import threading
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 from os import listdir
 from os.path import isfile, join
-from typing import Dict
+from typing import Dict, List, Optional, Tuple, Union
 
+import numpy as np
 import plotly.graph_objects as go
 from dash_html_components import Figure
 
+from motor_catalog import MotorCatalog, content_hash, curve_hash, load_catalog, source_signature, write_catalog
+
 
 class ThrustCurve:
-    def __init__(self, file_name: str):
+    def __init__(self, file_name: str, text: str = None, lazy: bool = False):
         """ The thrust curve.
 
         :param file_name: The file name including file extension.
         The file extension has to be .eng. E.g. 'Estes_D12.eng'
+        :param text: The contents of the file. Default: the file is read from the thrust curve folder.
+        :param lazy: Only read the header of the file now. The thrust curve and the metrics derived from it are read
+        and calculated the first time they are accessed.
         """
         # TODO: load thrust curves with API
         # https://www.thrustcurve.org/info/api.html
@@ -22,33 +34,118 @@ class ThrustCurve:
         if not file_name.endswith('.eng'):
             raise Exception('File should be of type .eng')
         self.file_name = file_name
-
-        with open(os.path.join('.', thrust_folder, file_name), 'r') as f:
-            file_text = f.read()
-            lines = file_text.splitlines()
-            lines = [line.strip() for line in lines if line and not line.startswith(';')]
-            header_line = lines[0].split()
-
-            self.name = header_line[0]
-            self.diameter = int(float(header_line[1]))  # mm
-            self.length = float(header_line[2])  # mm
-            self.delays = [int(d) if type(d) == 'int' else d for d in header_line[3].split('-')]
-            self.prop_mass = float(header_line[4])  # kg
-            self.wet_mass = float(header_line[5])  # kg
-            self.dry_mass = self.wet_mass - self.prop_mass  # kg
-
         self.manufacturer = map_manufacturer(file_name.split('_')[0])
-        self.thrust_curve = read_thrust_curve(file_name)  # {s, N}
-        self.impulse = calc_impulse(self.thrust_curve, 2)  # Ns
-        tc_5_percent = get_5_percent_thrust_range(self.thrust_curve)
-        self.avg_thrust = calc_average_thrust(tc_5_percent, 2)  # N
-        self.burn_time = calc_burn_time(tc_5_percent, 2)  # s
-        self.burnout = max(tc_5_percent.keys())
+        self._catalog = None
+        self._record = None
+        self._thrust_curve = None
+        self._metrics = None
+
+        if lazy and text is None:
+            self._set_header(read_eng_header(read_eng_header_text(os.path.join('.', thrust_folder, file_name))))
+            return
+
+        if text is None:
+            with open(os.path.join('.', thrust_folder, file_name), 'r') as f:
+                text = f.read()
+        self._set_header(read_eng_header(text))
+        self._set_thrust_curve(parse_thrust_curve(text))
+        if not lazy:
+            self._calc_metrics()
         # self.impulse_range = ''
         # self.mass_curve = {}  # s,kg  # approximate
 
+    @classmethod
+    def from_catalog(cls, catalog: MotorCatalog, record: dict) -> 'ThrustCurve':
+        """ Creates the thrust curve from a compiled catalog record without touching the .eng file. The metrics come
+        from the precomputed summary in the record; the thrust curve itself is only read from the catalog the first
+        time it is accessed.
+
+        :param catalog: The catalog that contains the record.
+        :param record: The record of the motor.
+        :return: The thrust curve.
+        """
+        curve = cls.__new__(cls)
+        curve.file_name = record['file_name']
+        curve.manufacturer = record['manufacturer']
+        curve._set_header(record)
+        curve._catalog = catalog
+        curve._record = record
+        curve._thrust_curve = None
+        curve._metrics = {key: record[key] for key in ('impulse', 'avg_thrust', 'burn_time', 'burnout')}
+        return curve
+
+    def _set_header(self, header: dict):
+        self.name = header['name']
+        self.diameter = header['diameter']  # mm
+        self.length = header['length']  # mm
+        self.delays = header['delays']
+        self.prop_mass = header['prop_mass']  # kg
+        self.wet_mass = header['wet_mass']  # kg
+        self.dry_mass = self.wet_mass - self.prop_mass  # kg
+
+    @property
+    def thrust_curve(self) -> Dict[float, float]:
+        """ The thrust curve {s, N}. It is materialized on first access and may be evicted again by loaded_curves. """
+        # A local reference: loaded_curves may evict the curve again at any time, also from another thread
+        thrust_curve = self._thrust_curve
+        if thrust_curve is None:
+            if self._catalog is not None:
+                times, thrusts = self._catalog.curve(self._record)
+                thrust_curve = dict(zip(times.tolist(), thrusts.tolist()))
+            else:
+                thrust_curve = read_thrust_curve(self.file_name)
+            self._set_thrust_curve(thrust_curve)
+        else:
+            loaded_curves.touch(self)
+        return thrust_curve
+
+    def _set_thrust_curve(self, thrust_curve: Dict[float, float]):
+        self._thrust_curve = thrust_curve
+        loaded_curves.add(self)
+
+    @property
+    def thrust_curve_arrays(self) -> Tuple[np.ndarray, np.ndarray]:
+        """ The times (s) and thrusts (N) of the thrust curve. Catalog motors return views into the catalog without
+        materializing the thrust curve dict.
+        """
+        if self._thrust_curve is None and self._catalog is not None:
+            return self._catalog.curve(self._record)
+        return thrust_curve_to_arrays(self.thrust_curve)
+
+    def _calc_metrics(self):
+        metrics = calc_thrust_metrics(*self.thrust_curve_arrays)
+        self._metrics = {'impulse': round(metrics['impulse'], 2),
+                         'avg_thrust': round(metrics['avg_thrust'], 2),
+                         'burn_time': round(metrics['burn_time'], 2),
+                         'burnout': metrics['burnout']}
+
+    def _metric(self, name: str) -> float:
+        if self._metrics is None:
+            self._calc_metrics()
+        return self._metrics[name]
+
+    @property
+    def impulse(self) -> float:
+        """ The total impulse in Ns. """
+        return self._metric('impulse')
+
+    @property
+    def avg_thrust(self) -> float:
+        """ The average thrust in N. """
+        return self._metric('avg_thrust')
+
+    @property
+    def burn_time(self) -> float:
+        """ The burn time in s. """
+        return self._metric('burn_time')
+
+    @property
+    def burnout(self) -> float:
+        """ The time of burnout in s. """
+        return self._metric('burnout')
+
     def plot(self):
-        return get_thrust_curve_plot(interpolate_thrust_curve(self.thrust_curve),
+        return get_thrust_curve_plot(interpolate_thrust_curve_arrays(*self.thrust_curve_arrays),
                                      avg_thrust=self.avg_thrust,
                                      title=str(self))
 
@@ -56,6 +153,125 @@ class ThrustCurve:
         return f'{self.manufacturer} {self.name}'
 
 
+class LoadedCurves:
+    def __init__(self, max_size: Optional[int] = None):
+        """ Keeps track of the thrust curves whose points are materialized in memory. Only weak references are kept,
+        so this never keeps a ThrustCurve alive.
+
+        :param max_size: The maximum number of materialized thrust curves, at least 1. When more are loaded, the least
+        recently used one is dropped again and re-read from the catalog or file on its next access. Default: unbounded.
+        """
+        self._curves = OrderedDict()  # id -> weakref to ThrustCurve
+        self._lock = threading.RLock()  # Reentrant: a weakref callback may run while the lock is held
+        self._max_size = None
+        self.max_size = max_size
+
+    @property
+    def max_size(self) -> Optional[int]:
+        return self._max_size
+
+    @max_size.setter
+    def max_size(self, max_size: Optional[int]):
+        if max_size is not None and max_size < 1:
+            raise ValueError('max_size should be at least 1, or None for unbounded')
+        with self._lock:
+            self._max_size = max_size
+            self._evict()
+
+    def add(self, curve: ThrustCurve):
+        key = id(curve)
+        with self._lock:
+            self._curves[key] = weakref.ref(curve, lambda _: self._discard(key))
+            self._curves.move_to_end(key)
+            self._evict()
+
+    def _discard(self, key: int):
+        with self._lock:
+            self._curves.pop(key, None)
+
+    def _evict(self):
+        while self._max_size is not None and len(self._curves) > self._max_size:
+            _, ref = self._curves.popitem(last=False)
+            evicted = ref()
+            if evicted is not None:
+                evicted._thrust_curve = None
+
+    def touch(self, curve: ThrustCurve):
+        with self._lock:
+            if id(curve) in self._curves:
+                self._curves.move_to_end(id(curve))
+
+    def __len__(self):
+        with self._lock:
+            return len(self._curves)
+
+
+class ThrustCurveRegistry:
+    def __init__(self, max_size: int = 128):
+        """ A process-wide registry to look motors up by file name without re-parsing them.
+
+        Motors from the catalog are served as long as their file's mtime matches the catalog. Motors that are not in
+        the catalog, or whose file changed since, are parsed once and kept in an LRU cache until their mtime changes.
+
+        :param max_size: The maximum number of parsed motors to keep in the LRU cache.
+        """
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.catalog: Optional[MotorCatalog] = None  # The catalog of the registered motors
+        self._catalog_curves = {}  # file_name -> (mtime_ns, ThrustCurve)
+        self._parsed_curves = OrderedDict()  # file_name -> (mtime_ns, ThrustCurve)
+        self._lock = threading.Lock()
+
+    def register_catalog(self, catalog: MotorCatalog, curves: List[ThrustCurve]):
+        """ Serves the motors of the catalog from now on, replacing the ones registered before.
+
+        :param catalog: The catalog the motors were loaded from.
+        :param curves: The motors.
+        """
+        catalog_curves = {tc.file_name: (catalog.sources[tc.file_name][1], tc) for tc in curves}
+        with self._lock:
+            self.catalog = catalog
+            self._catalog_curves = catalog_curves
+            self._parsed_curves.clear()
+
+    def get(self, file_name: str) -> ThrustCurve:
+        """ :return: The motor of the file. Only parses the file if it is not cached or if it changed. """
+        mtime = os.stat(os.path.join('.', thrust_folder, file_name)).st_mtime_ns
+        with self._lock:
+            for cache in (self._catalog_curves, self._parsed_curves):
+                entry = cache.get(file_name)
+                if entry and entry[0] == mtime:
+                    self.hits += 1
+                    if cache is self._parsed_curves:
+                        cache.move_to_end(file_name)
+                    return entry[1]
+            self.misses += 1
+
+        curve = ThrustCurve(file_name)
+        with self._lock:
+            self._parsed_curves[file_name] = (mtime, curve)
+            self._parsed_curves.move_to_end(file_name)
+            while len(self._parsed_curves) > self.max_size:
+                self._parsed_curves.popitem(last=False)
+        return curve
+
+    def stats(self) -> Dict[str, int]:
+        """ :return: The number of hits and misses, and the number of parsed motors in the LRU cache. """
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'parsed': len(self._parsed_curves)}
+
+
+def get_thrust_curve(file_name: str) -> ThrustCurve:
+    """ Looks the motor up in the process-wide registry. Use this instead of ThrustCurve(file_name) to avoid reading
+    and parsing the file on every call.
+
+    :param file_name: The file name including file extension. E.g. 'Estes_D12.eng'
+    :return: The motor.
+    """
+    return registry.get(file_name)
+
+
 def map_manufacturer(name: str) -> str:
     mapping = {'AeroTech': 'AeroTech',
                'AMW': 'Animal Motor Works',
@@ -75,11 +291,14 @@ def map_manufacturer(name: str) -> str:
     return name
 
 
-def get_thrust_curve_plot(thrust_curve: Dict[float, float], avg_thrust: float = None, burnout: float = None,
-                          title: str = '') -> Figure:
-    """ Plots the thrust curve. The file name is used to make a title to the graph. """
-    t = list(thrust_curve.keys())
-    F = list(thrust_curve.values())
+def get_thrust_curve_plot(thrust_curve: Union[Dict[float, float], Tuple[np.ndarray, np.ndarray]],
+                          avg_thrust: float = None, burnout: float = None, title: str = '') -> Figure:
+    """ Plots the thrust curve, given either as a dict or as a pair of time and thrust arrays. The file name is used to
+    make a title to the graph.
+    """
+    if isinstance(thrust_curve, dict):
+        thrust_curve = thrust_curve_to_arrays(thrust_curve)
+    t, F = thrust_curve[0].tolist(), thrust_curve[1].tolist()
     fig = go.Figure()
 
     fig.add_trace(go.Scatter(x=t,
@@ -113,13 +332,17 @@ def get_thrust_curve_plot(thrust_curve: Dict[float, float], avg_thrust: float =
 
 def read_thrust_curve(file_name: str) -> Dict[float, float]:
     """ Converts the raw thrust curve data file to a dictionary. """
-    if 'thrust_files' in locals() and file_name not in thrust_files or \
-            'thrust_curves' in locals() and file_name not in [c.file_name for c in thrust_curves]:
+    # thrust_files is replaced together with the motors when they are reloaded, so it lists the files of the motors
+    if file_name not in thrust_files:
         raise FileNotFoundError(f'{file_name} does not exist in the directory "{thrust_folder}"')
 
     with open(os.path.join('.', thrust_folder, file_name), 'r') as f:
-        file_text = f.read()
-        thrust_curve = read_eng_thrust_curve(file_text)
+        return parse_thrust_curve(f.read())
+
+
+def parse_thrust_curve(text: str) -> Dict[float, float]:
+    """ Converts the raw thrust curve .eng data file to a dictionary that starts at t = 0 and is sorted by time. """
+    thrust_curve = read_eng_thrust_curve(text)
 
     if 0 not in thrust_curve.keys():
         thrust_curve[0] = 0
@@ -129,6 +352,39 @@ def read_thrust_curve(file_name: str) -> Dict[float, float]:
     return tc
 
 
+def read_eng_header_text(path: str) -> str:
+    """ Reads a .eng file up to and including its header line, skipping the thrust data.
+
+    :param path: The path to the file.
+    :return: The comments and the header line.
+    """
+    lines = []
+    with open(path, 'r') as f:
+        for line in f:
+            lines.append(line)
+            if line.strip() and not line.startswith(';'):
+                break
+    return ''.join(lines)
+
+
+def read_eng_header(text: str) -> dict:
+    """ Reads the header line of a raw .eng data file.
+
+    :param text: The raw data from the file
+    :return: The name, diameter (mm), length (mm), delays, propellant mass (kg) and wet mass (kg) of the motor.
+    """
+    lines = text.splitlines()
+    lines = [line.strip() for line in lines if line and not line.startswith(';')]
+    header_line = lines[0].split()
+
+    return {'name': header_line[0],
+            'diameter': int(float(header_line[1])),
+            'length': float(header_line[2]),
+            'delays': [int(d) if type(d) == 'int' else d for d in header_line[3].split('-')],
+            'prop_mass': float(header_line[4]),
+            'wet_mass': float(header_line[5])}
+
+
 def read_eng_thrust_curve(text: str) -> Dict[float, float]:
     """ Converts the raw thrust curve .eng data file to a dictionary.
 
@@ -172,20 +428,45 @@ def calc_burn_time(thrust_curve: Dict[float, float], ndigits: int = None) -> flo
     return round(t, ndigits) if ndigits else t
 
 
+def calc_thrust_metrics(t: np.ndarray, F: np.ndarray) -> Dict[str, float]:
+    """ Calculates the summary metrics of a thrust curve. The average thrust, burn time and burnout are based on the
+    part of the curve where the thrust is > 5% of the max thrust.
+
+    :param t: The times of the thrust curve.
+    :param F: The thrusts of the thrust curve.
+    :return: The impulse (Ns), average thrust (N), burn time (s) and burnout (s). Not rounded.
+    """
+    t_5, F_5 = get_5_percent_thrust_range_arrays(t, F)
+    impulse_5 = calc_impulse_arrays(t_5, F_5)
+    burn_time = float(t_5[-1] - t_5[0])
+    return {'impulse': calc_impulse_arrays(t, F),
+            'avg_thrust': impulse_5 / (burn_time if burn_time != 0 else float(t_5[-1])),
+            'burn_time': burn_time,
+            'burnout': float(t_5[-1])}
+
+
 def get_5_percent_thrust_range(thrust_curve: Dict[float, float]) -> Dict[float, float]:
     """ Removes the thrusts where the thrust is <= 5% of the max thrust.
 
     :param thrust_curve: The thrust curve.
     :return: The thrust curve where every thrust value is > 5% of the max thrust.
     """
-    interp_tc = interpolate_thrust_curve(thrust_curve)
-    max_thrust = max(interp_tc.values())
-    threshold = max_thrust * 0.05
-    valid_thrust_curve = {}
-    for t, F in interp_tc.items():
-        if F > threshold:
-            valid_thrust_curve[t] = F
-    return valid_thrust_curve
+    t, F = get_5_percent_thrust_range_arrays(*thrust_curve_to_arrays(thrust_curve))
+    return dict(zip(t.tolist(), F.tolist()))
+
+
+def get_5_percent_thrust_range_arrays(t: np.ndarray, F: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """ Interpolates the thrust curve and removes the thrusts where the thrust is <= 5% of the max thrust. The max
+    thrust is taken from the data points, so short peaks between two grid points still count.
+
+    :param t: The times of the thrust curve.
+    :param F: The thrusts of the thrust curve.
+    :return: The times and thrusts where every thrust value is > 5% of the max thrust.
+    """
+    threshold = np.max(F) * 0.05
+    t, F = interpolate_thrust_curve_arrays(t, F)
+    valid = F > threshold
+    return t[valid], F[valid]
 
 
 def interpolate_thrust_curve(thrust_curve: Dict[float, float], dt: float = 0.01) -> Dict[float, float]:
@@ -195,17 +476,24 @@ def interpolate_thrust_curve(thrust_curve: Dict[float, float], dt: float = 0.01)
     :param dt: The size of the time steps in the interpolation.
     :return: The interpolated thrust curve.
     """
-    times = list(thrust_curve.keys())
-    thrusts = list(thrust_curve.values())
+    t, F = interpolate_thrust_curve_arrays(*thrust_curve_to_arrays(thrust_curve), dt)
+    return dict(zip(t.tolist(), F.tolist()))
 
-    interpolated = {}
 
-    for i in range(len(times) - 1):
-        inter = interpolate_between_points(times[i], thrusts[i], times[i + 1], thrusts[i + 1], dt)
-        for k, v in inter.items():
-            interpolated[k] = v
+def interpolate_thrust_curve_arrays(t: np.ndarray, F: np.ndarray, dt: float = 0.01) \
+        -> Tuple[np.ndarray, np.ndarray]:
+    """ Interpolates the thrust curve linearly on a uniform time grid. Every time on the grid is calculated as
+    t0 + i * dt, so the grid doesn't drift.
 
-    return interpolated
+    :param t: The times of the thrust curve. Should be sorted.
+    :param F: The thrusts of the thrust curve.
+    :param dt: The size of the time steps in the interpolation.
+    :return: The times on the grid from the first up to and including the last time, and the interpolated thrusts.
+    """
+    t = np.asarray(t, dtype=float)
+    n = int(np.floor((t[-1] - t[0]) / dt + 1e-9)) + 1
+    grid = t[0] + dt * np.arange(n)
+    return grid, np.interp(grid, t, F)
 
 
 def interpolate_between_points(x0: float, y0: float, x1: float, y1: float, dx: float) -> Dict[float, float]:
@@ -216,18 +504,26 @@ def interpolate_between_points(x0: float, y0: float, x1: float, y1: float, dx: f
     :param x1: The x-coordinate of the second point.
     :param y1: The y-coordinate of the second point.
     :param dx: The step size in the interpolation.
-    :return: A dict of the interpolated line.
+    :return: A dict of the interpolated line. The second point is not included.
     """
-    m = (y1 - y0) / (x1 - x0)
-    b = y0 - m * x0
-    interpolated = {}
+    x = x0 + dx * np.arange(int(np.ceil((x1 - x0) / dx - 1e-9)))
+    return dict(zip(x.tolist(), np.interp(x, [x0, x1], [y0, y1]).tolist()))
 
-    x = x0
-    while x < x1:
-        interpolated[x] = m * x + b
-        x += dx
 
-    return interpolated
+def thrust_curve_to_arrays(thrust_curve: Dict[float, float]) -> Tuple[np.ndarray, np.ndarray]:
+    """ :return: The times and thrusts of the thrust curve as arrays. """
+    return (np.fromiter(thrust_curve.keys(), dtype=float, count=len(thrust_curve)),
+            np.fromiter(thrust_curve.values(), dtype=float, count=len(thrust_curve)))
+
+
+def calc_impulse_arrays(t: np.ndarray, F: np.ndarray) -> float:
+    """ Uses trapezoid integral approximation to calculate the impulse.
+
+    :param t: The times of the thrust curve.
+    :param F: The thrusts of the thrust curve.
+    :return: The impulse. Not rounded.
+    """
+    return float(np.sum(np.diff(t) * (F[1:] + F[:-1]) / 2))
 
 
 def calc_impulse(thrust_curve: Dict[float, float], ndigits: int = None) -> float:
@@ -246,7 +542,348 @@ def calc_impulse(thrust_curve: Dict[float, float], ndigits: int = None) -> float
     return round(area, ndigits) if ndigits else area
 
 
+def calc_thrust_metrics_batch(t: np.ndarray, F: np.ndarray, counts: np.ndarray, dt: float = 0.01) \
+        -> Dict[str, np.ndarray]:
+    """ Calculates the summary metrics of many thrust curves at once. Gives the same results as calc_thrust_metrics
+    for every curve, to within 1e-9 relative (only the order of the floating-point sums differs).
+
+    The curves are passed as one ragged array, so the whole catalog is interpolated in one pass and every per-curve
+    sum, max and first/last crossing becomes a bincount, reduceat or searchsorted.
+
+    :param t: The times of all thrust curves, concatenated. Every curve should be sorted.
+    :param F: The thrusts of all thrust curves, concatenated.
+    :param counts: The number of points of every curve. Should all be > 0.
+    :param dt: The size of the time steps in the interpolation for the 5% thrust range.
+    :return: Arrays with the impulse (Ns), average thrust (N), burn time (s) and burnout (s) of every curve. Not
+    rounded.
+    """
+    t = np.asarray(t, dtype=float)
+    F = np.asarray(F, dtype=float)
+    counts = np.asarray(counts, dtype=np.int64)
+    m = len(counts)
+    ids = np.arange(m)
+    starts = np.cumsum(counts) - counts
+    ends = starts + counts - 1
+    curve_id = np.repeat(ids, counts)
+
+    # Impulse over the raw points: trapezoids between consecutive points of the same curve
+    same = curve_id[1:] == curve_id[:-1]
+    areas = np.diff(t) * (F[1:] + F[:-1]) / 2
+    impulse = np.bincount(curve_id[1:][same], weights=areas[same], minlength=m)
+
+    # Every curve on its own uniform grid, the same grid as interpolate_thrust_curve_arrays
+    n_grid = np.floor((t[ends] - t[starts]) / dt + 1e-9).astype(np.int64) + 1
+    grid_id = np.repeat(ids, n_grid)
+    grid_t = t[starts][grid_id] + dt * (np.arange(n_grid.sum()) - np.repeat(np.cumsum(n_grid) - n_grid, n_grid))
+
+    # Find the last point at or before every grid time by sorting points and grid times together per curve (the grid
+    # times keep their order), then interpolate the same way np.interp does
+    order = np.lexsort((np.r_[np.zeros(len(t)), np.ones(len(grid_t))], np.r_[t, grid_t], np.r_[curve_id, grid_id]))
+    is_point = order < len(t)
+    j = (np.cumsum(is_point) - 1)[~is_point]
+    at_point = (grid_t == t[j]) | (j == ends[grid_id])
+    k = np.minimum(j + 1, len(t) - 1)
+    slope = (F[k] - F[j]) / np.where(at_point, 1, t[k] - t[j])
+    grid_F = np.where(at_point, F[j], slope * (grid_t - t[j]) + F[j])
+
+    # 5% thrust range
+    threshold = np.maximum.reduceat(F, starts) * 0.05
+    valid = grid_F > threshold[grid_id]
+    valid_id = grid_id[valid]
+    valid_t = grid_t[valid]
+    valid_F = grid_F[valid]
+    first = valid_t[np.searchsorted(valid_id, ids, 'left')]
+    burnout = valid_t[np.searchsorted(valid_id, ids, 'right') - 1]
+    same = valid_id[1:] == valid_id[:-1]
+    areas = np.diff(valid_t) * (valid_F[1:] + valid_F[:-1]) / 2
+    impulse_5 = np.bincount(valid_id[1:][same], weights=areas[same], minlength=m)
+    burn_time = burnout - first
+
+    return {'impulse': impulse,
+            'avg_thrust': impulse_5 / np.where(burn_time != 0, burn_time, burnout),
+            'burn_time': burn_time,
+            'burnout': burnout}
+
+
+def read_catalog_record(file_name: str) -> Tuple[dict, np.ndarray]:
+    """ Reads a .eng file for the catalog. The file is read once.
+
+    :param file_name: The .eng file in the thrust curve folder.
+    :return: The catalog record without the summary metrics and the location in the catalog, and the (n, 2) array of
+    times and thrusts.
+    """
+    with open(os.path.join('.', thrust_folder, file_name), 'rb') as f:
+        data = f.read()
+    text = data.decode('utf-8', errors='replace')
+    points = np.array(list(parse_thrust_curve(text).items()), dtype=float).reshape(-1, 2)
+    record = {'file_name': file_name,
+              'content_hash': content_hash(data),
+              'curve_hash': curve_hash(points),
+              'manufacturer': map_manufacturer(file_name.split('_')[0])}
+    record.update(read_eng_header(text))
+    return record, points
+
+
+def assemble_catalog(parsed: List[Tuple[dict, np.ndarray]], sources: Dict[str, list]) -> MotorCatalog:
+    """ Packs parsed records into a catalog and calculates the summary metrics of all thrust curves in one batch.
+    Files with identical thrust curves share their points in the catalog and the later ones are marked as duplicates
+    of the first one.
+
+    :param parsed: The results of read_catalog_record, in catalog order.
+    :param sources: The source signature of the files.
+    :return: The catalog.
+    """
+    records = []
+    chunks = []
+    n_points = 0
+    by_hash = {}
+    for record, points in parsed:
+        record = dict(record, duplicate_of=None)
+        original = by_hash.get(record['curve_hash'])
+        if original:
+            record.update(offset=original['offset'], count=original['count'], duplicate_of=original['file_name'])
+        else:
+            record.update(offset=n_points, count=len(points))
+            chunks.append(points)
+            n_points += record['count']
+            by_hash[record['curve_hash']] = record
+        records.append(record)
+    catalog = MotorCatalog(records, np.concatenate(chunks) if chunks else np.empty((0, 2)), sources)
+    update_catalog_metrics(catalog)
+    return catalog
+
+
+def update_catalog_metrics(catalog: MotorCatalog):
+    """ (Re)calculates the summary metrics of every record in the catalog in one batch. The metrics are rounded the
+    same way as the ThrustCurve attributes.
+
+    :param catalog: The catalog to update.
+    """
+    originals = [r for r in catalog.records if not r['duplicate_of']]
+    if not originals:
+        return
+    # Unique curves are stored back to back in the order of their original records
+    metrics = calc_thrust_metrics_batch(catalog.points[:, 0], catalog.points[:, 1],
+                                        [r['count'] for r in originals])
+    by_offset = {r['offset']: i for i, r in enumerate(originals)}
+    for record in catalog.records:
+        i = by_offset[record['offset']]
+        record.update(impulse=round(float(metrics['impulse'][i]), 2),
+                      avg_thrust=round(float(metrics['avg_thrust'][i]), 2),
+                      burn_time=round(float(metrics['burn_time'][i]), 2),
+                      burnout=float(metrics['burnout'][i]))
+
+
+def build_catalog(file_names: List[str], workers: int = None) -> MotorCatalog:
+    """ Compiles the .eng files into a catalog. Files that can't be parsed are left out of the catalog and reported in
+    its errors instead of aborting the build.
+
+    :param file_names: The .eng files in the thrust curve folder.
+    :param workers: The number of processes to parse the files with. Default: ingest_workers.
+    :return: The catalog, with the records in the same order as the file names.
+    """
+    sources = source_signature(thrust_folder, file_names)
+    parsed, errors = ingest_thrust_files(file_names, workers)
+    catalog = assemble_catalog(parsed, sources)
+    catalog.errors = errors
+    return catalog
+
+
+def update_catalog(catalog: MotorCatalog, file_names: List[str], workers: int = None) -> MotorCatalog:
+    """ Brings a catalog up to date with the .eng files. Only the files that were added or changed since the catalog
+    was built are parsed; the records and points of the others are taken over from the catalog.
+
+    :param catalog: The catalog to update. It isn't modified, so the motors loaded from it keep working.
+    :param file_names: The .eng files that are currently in the thrust curve folder.
+    :param workers: The number of processes to parse the files with. Default: ingest_workers.
+    :return: The new catalog, with the records in the same order as the file names.
+    """
+    sources = source_signature(thrust_folder, file_names)
+    changed = [file_name for file_name in file_names if catalog.sources.get(file_name) != sources[file_name]]
+    parsed, errors = ingest_thrust_files(changed, workers)
+    reparsed = {record['file_name']: (record, points) for record, points in parsed}
+    records = {record['file_name']: record for record in catalog.records}
+
+    merged = []
+    for file_name in file_names:
+        if file_name in reparsed:
+            merged.append(reparsed[file_name])
+        elif file_name in records and file_name not in errors:
+            record = records[file_name]
+            merged.append((record, np.column_stack(catalog.curve(record))))
+    # Files that still fail keep their error until they change
+    errors.update({file_name: error for file_name, error in catalog.errors.items()
+                   if file_name in sources and file_name not in changed})
+    updated = assemble_catalog(merged, sources)
+    updated.errors = errors
+    return updated
+
+
+def ingest_thrust_files(file_names: List[str], workers: int = None, chunk_size: int = 64) \
+        -> Tuple[List[Tuple[dict, np.ndarray]], Dict[str, str]]:
+    """ Parses the .eng files for the catalog, sharded across a process pool. Small batches are parsed in this process
+    because starting the pool would take longer.
+
+    :param file_names: The .eng files in the thrust curve folder.
+    :param workers: The number of processes. Default: ingest_workers.
+    :param chunk_size: The number of files per task.
+    :return: The results of read_catalog_record in the same order as the file names (files that failed are left
+    out), and the error message of every file that failed.
+    """
+    workers = workers or ingest_workers or 1
+    chunks = [file_names[i:i + chunk_size] for i in range(0, len(file_names), chunk_size)]
+    # Never start a pool from a pool worker (workers that are spawned import this module again)
+    if workers == 1 or len(chunks) < 2 or multiprocessing.parent_process() is not None:
+        results = [_read_catalog_records(chunk) for chunk in chunks]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(chunks))) as executor:
+            results = list(executor.map(_read_catalog_records, chunks))
+
+    parsed = []
+    errors = {}
+    for chunk in results:
+        for file_name, result, error in chunk:
+            if error is None:
+                parsed.append(result)
+            else:
+                errors[file_name] = error
+    return parsed, errors
+
+
+def _read_catalog_records(file_names: List[str]) -> List[Tuple[str, Optional[Tuple[dict, np.ndarray]], Optional[str]]]:
+    results = []
+    for file_name in file_names:
+        try:
+            results.append((file_name, read_catalog_record(file_name), None))
+        except Exception as e:
+            results.append((file_name, None, f'{type(e).__name__}: {e}'))
+    return results
+
+
+def load_thrust_curves(file_names: List[str]) -> List[ThrustCurve]:
+    """ Loads the thrust curves from the compiled catalog. The catalog is (re)built first if it is missing or if any
+    .eng file was added, removed or changed since it was built.
+
+    :param file_names: The .eng files in the thrust curve folder.
+    :return: The thrust curves in the same order as the file names.
+    """
+    catalog = load_catalog(catalog_file)
+    if catalog is None or catalog.is_stale(thrust_folder, file_names):
+        catalog = build_catalog(file_names)
+        _save_catalog(catalog)
+    return _register_catalog(catalog)
+
+
+def reload_thrust_curves() -> bool:
+    """ Picks up the .eng files that were added, changed or removed in the thrust curve folder since the motors were
+    loaded, without parsing the other files again (see update_catalog). thrust_files and thrust_curves are replaced
+    at once, so callers see either the old or the new motors, never a mix. Motors that haven't been loaded yet are
+    left alone: they will be loaded from the current files.
+
+    :return: Whether the motors changed.
+    """
+    global thrust_files, _thrust_curves
+    with _load_lock:
+        catalog = registry.catalog
+        if _thrust_curves is None or catalog is None:
+            return False
+        file_names = list_thrust_files()
+        if not catalog.is_stale(thrust_folder, file_names):
+            return False
+        catalog = update_catalog(catalog, file_names)
+        _save_catalog(catalog)
+        curves = _register_catalog(catalog)
+        thrust_files, _thrust_curves = file_names, curves
+    logger.info('Reloaded the thrust curves: %d motors', len(curves))
+    return True
+
+
+def _save_catalog(catalog: MotorCatalog):
+    try:
+        write_catalog(catalog_file, catalog)
+    except OSError:
+        pass  # Read-only deployments just build the catalog in memory on every start
+
+
+def _register_catalog(catalog: MotorCatalog) -> List[ThrustCurve]:
+    """ :return: The motors of the catalog, which are served by the registry from now on. """
+    for file_name, error in catalog.errors.items():
+        logger.warning('Skipped thrust curve %s: %s', file_name, error)
+    curves = [ThrustCurve.from_catalog(catalog, record) for record in catalog.records]
+    registry.register_catalog(catalog, curves)
+    return curves
+
+
+def list_thrust_files() -> List[str]:
+    """ :return: The .eng files in the thrust curve folder, sorted. """
+    return sorted(f for f in listdir(thrust_folder) if isfile(join(thrust_folder, f)) and f.endswith('.eng'))
+
+
+logger = logging.getLogger(__name__)
 thrust_folder = 'thrustcurve'
-thrust_files = [f for f in listdir(thrust_folder) if isfile(join(thrust_folder, f)) and f.endswith('.eng')]
+# The motor of a new session, see get_default_motor_file
+default_motor_file = 'Estes_C6.eng'
+# The number of processes used to parse .eng files when the catalog is (re)built.
+ingest_workers = os.cpu_count()
+# Bound it (e.g. loaded_curves.max_size = 256) to cap the memory used by materialized thrust curves.
+loaded_curves = LoadedCurves()
+registry = ThrustCurveRegistry()
+catalog_file = os.path.join('cache', 'motor_catalog.bin')
+thrust_files = list_thrust_files()
+# Set once the motors have been loaded
+ready = threading.Event()
+_thrust_curves = None
+_load_lock = threading.Lock()
+
+
+def get_thrust_curves() -> List[ThrustCurve]:
+    """ The motors are loaded from the catalog the first time they are needed, not when this module is imported.
+    Also available as the module attribute thrust_curves.
+
+    :return: All motors, in the order of thrust_files.
+    """
+    global _thrust_curves
+    if _thrust_curves is None:
+        with _load_lock:
+            if _thrust_curves is None:
+                _thrust_curves = load_thrust_curves(thrust_files)
+                ready.set()
+    return _thrust_curves
+
+
+def get_default_motor_file() -> str:
+    """ :return: The motor of a new session: default_motor_file, or the first motor if it isn't in the thrust curve
+    folder.
+    """
+    return default_motor_file if default_motor_file in thrust_files else thrust_files[0]
+
+
+def start_warmup(*then) -> threading.Thread:
+    """ Loads the motors in a background thread, so that they are ready before the first request needs them.
+
+    :param then: Functions to call in the same thread after the motors have been loaded, e.g. to build indexes.
+    :return: The thread.
+    """
+    def warm_up():
+        get_thrust_curves()
+        for function in then:
+            function()
+
+    thread = threading.Thread(target=warm_up, name='thrust-curve-warmup', daemon=True)
+    thread.start()
+    return thread
+
+
+def __getattr__(name: str):
+    if name == 'thrust_curves':
+        return get_thrust_curves()
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
 
-thrust_curves = [ThrustCurve(f) for f in thrust_files]
+if __name__ == '__main__':
+    # Build step: python thrust_curve.py
+    built = build_catalog(thrust_files)
+    write_catalog(catalog_file, built)
+    print(f'Compiled {len(built.records)} thrust curves into {catalog_file}')
+    for failed_file, failure in built.errors.items():
+        print(f'Skipped {failed_file}: {failure}')